@@ -0,0 +1,54 @@
+"""
+Builds the cache settings from environment variables, like
+OWScheduler.databases does for the database.
+
+CACHE_BACKEND picks where cached data is kept:
+
+* locmem (default): in each process's memory. Fine for one process, but
+  other processes won't see changes until their entries expire.
+* file: files in the CACHE_LOCATION directory (default
+  /var/tmp/owscheduler_cache), shared by every process on the server.
+* db: the CACHE_LOCATION table (default owscheduler_cache) in the database,
+  shared by every server. Make it with `python manage.py createcachetable`.
+* dummy: nothing is cached.
+
+CACHE_TIMEOUT sets the default seconds entries are kept (default 300).
+"""
+import os
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+
+LOCATIONS = {
+    'locmem': 'owscheduler',
+    'file': '/var/tmp/owscheduler_cache',
+    'db': 'owscheduler_cache',
+    'dummy': '',
+}
+
+# seconds entries are kept unless CACHE_TIMEOUT is set
+TIMEOUT = 300
+
+
+def cache_config(environ, base_dir=''):
+    """
+    :param environ: environment variables, usually os.environ
+    :param base_dir: directory relative cache directories are in
+    :return: settings for the default cache
+    :raises ValueError: if CACHE_BACKEND isn't one of BACKENDS
+    """
+    backend = environ.get('CACHE_BACKEND', 'locmem').lower()
+    if backend not in BACKENDS:
+        raise ValueError("Unknown CACHE_BACKEND: %s" % backend)
+    location = environ.get('CACHE_LOCATION', LOCATIONS[backend])
+    if backend == 'file' and not os.path.isabs(location):
+        location = os.path.join(base_dir, location)
+    return {
+        'BACKEND': BACKENDS[backend],
+        'LOCATION': location,
+        'TIMEOUT': int(environ.get('CACHE_TIMEOUT', TIMEOUT)),
+    }
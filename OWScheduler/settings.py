@@ -12,6 +12,14 @@ https://docs.djangoproject.com/en/2.1/ref/settings/
 
 import os
 
+from OWScheduler.caches import cache_config
+from OWScheduler.databases import database_config
+
+try:
+    import django_heroku
+except ImportError:  # only installed on Heroku
+    django_heroku = None
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -43,12 +51,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'scheduler.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'scheduler.middleware.CurrentPlayerMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -65,6 +75,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'scheduler.context_processors.login',
+                'scheduler.context_processors.page_cache',
             ],
         },
     },
@@ -76,17 +88,53 @@ WSGI_APPLICATION = 'OWScheduler.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
+# set with DATABASE_URL or DB_* environment variables, see
+# OWScheduler/databases.py. Connections are kept open between requests
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': 'scheduler',
-        'USER': 'ows',
-        'PASSWORD': 'ows',
-        'HOST': 'localhost',
-        'PORT': '',
-    }
+    'default': database_config(os.environ, BASE_DIR),
+}
+
+
+# Caches
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+# set with CACHE_BACKEND (locmem, file, db, or dummy) and CACHE_LOCATION, see
+# OWScheduler/caches.py. Local memory is used by default. When running more
+# than one process, use a shared backend so team changes are seen by every
+# process. The db backend needs `python manage.py createcachetable`
+
+CACHES = {
+    'default': cache_config(os.environ, BASE_DIR),
 }
 
+# cache alias and timeout (seconds) for team membership lookups
+SCHEDULER_CACHE = 'default'
+SCHEDULER_CACHE_TIMEOUT = 60 * 60
+# with the local memory cache other processes can't clear a changed admin,
+# so admin lookups expire after this many seconds instead
+SCHEDULER_LOCAL_ADMIN_TIMEOUT = 60
+
+# cache alias and timeout (seconds) for the pages shown to visitors who
+# aren't logged in and the cached directory tables
+SCHEDULER_PAGE_CACHE = 'default'
+SCHEDULER_PAGE_CACHE_TIMEOUT = 5 * 60
+
+# in-process cache of autocomplete results: most searches kept and seconds
+# each is kept for. Hit rates are shown at /autocomplete-stats/
+AUTOCOMPLETE_CACHE_SIZE = 1024
+AUTOCOMPLETE_CACHE_TIMEOUT = 60
+
+# seconds before the matchmaking index of every team's SR and availability
+# is rebuilt
+MATCHMAKING_INDEX_TIMEOUT = 60
+
+# record the queries and timing of every scheduler view, shown at
+# /profile-stats/ and by `python manage.py profile_report`. Totals are kept
+# for the last SCHEDULER_PROFILING_WINDOW requests of each view, and a query
+# run SCHEDULER_PROFILING_REPEATS times in one request is flagged as N+1
+SCHEDULER_PROFILING = False
+SCHEDULER_PROFILING_WINDOW = 1000
+SCHEDULER_PROFILING_REPEATS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -152,5 +200,7 @@ EMAIL_HOST_USER = 'ows'
 EMAIL_HOST_PASSWORD = ''
 EMAIL_USE_TLS = True
 
-# Activate Django-Heroku
-django_heroku.settings(locals())
+# Activate Django-Heroku, keeping the database settings above since they
+# already read DATABASE_URL
+if django_heroku is not None:
+    django_heroku.settings(locals(), databases=False)
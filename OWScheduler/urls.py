@@ -11,7 +11,7 @@ from django.conf.urls import include, url
 from django.contrib.auth import views as auth_views
 
 from scheduler.views import user_logout, register, \
-    TeamAutoComplete, PlayerAutoComplete
+    TeamAutoComplete, PlayerAutoComplete, autocomplete_stats, profile_stats
 
 urlpatterns = [
     path('admin/', admin.site.urls),  # admin page
@@ -41,6 +41,10 @@ urlpatterns = [
         name='team-autocomplete'),
     url(r'^player-autocomplete/$', PlayerAutoComplete.as_view(),
         name='player-autocomplete'),
+    url(r'^autocomplete-stats/$', autocomplete_stats,
+        name='autocomplete-stats'),  # result cache hit rate for staff
+    url(r'^profile-stats/$', profile_stats,
+        name='profile-stats'),  # slowest views for staff
     # path('', include('django.contrib.auth.urls')),
 
 ]
@@ -0,0 +1,86 @@
+"""
+Maintains TeamStats, the stored totals for each team's roster. The totals
+are recounted by the database for only the teams that changed, so reading
+them is a single row lookup no matter how big the roster is.
+"""
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from scheduler.models import Player, Team, TeamStats
+
+
+def count_rosters(team_ids=None):
+    """
+    Counts rosters with one grouped query
+
+    :param team_ids: teamIDs to count, or None for every team
+    :return: dict of teamID to a dict of TeamStats field values. Teams with
+        nobody on them are left out
+    """
+    rows = Team.players.through.objects.all()
+    if team_ids is not None:
+        rows = rows.filter(team_id__in=team_ids)
+    rows = rows.values('team_id').annotate(
+        num_players=Count('player_id'),
+        sr_total=Sum('player__skillRating'),
+        sr_count=Count('player__skillRating'),
+        tank_count=Count('player_id', filter=Q(player__role=Player.TANK)),
+        damage_count=Count('player_id',
+                           filter=Q(player__role=Player.DAMAGE)),
+        support_count=Count('player_id',
+                            filter=Q(player__role=Player.SUPPORT)),
+    ).order_by()
+    totals = {}
+    for row in rows:
+        team_id = row.pop('team_id')
+        row['sr_total'] = row['sr_total'] or 0
+        totals[team_id] = row
+    return totals
+
+
+def refresh_team_stats(team_ids):
+    """
+    Recounts the totals of some teams
+
+    :param team_ids: teamIDs of the teams whose rosters changed
+    """
+    team_ids = list(Team.objects.filter(pk__in=list(team_ids)).
+                    values_list('pk', flat=True))
+    if not team_ids:
+        return
+    totals = count_rosters(team_ids)
+    with transaction.atomic():
+        for team_id in team_ids:
+            TeamStats.objects.update_or_create(
+                team_id=team_id, defaults=totals.get(team_id, {
+                    'num_players': 0, 'sr_total': 0, 'sr_count': 0,
+                    'tank_count': 0, 'damage_count': 0, 'support_count': 0,
+                }))
+
+
+def rebuild_team_stats(batch_size=1000):
+    """
+    Recounts every team's totals in bulk
+
+    :param batch_size: rows inserted per query
+    :return: number of teams counted
+    """
+    totals = count_rosters()
+    stats = [TeamStats(team_id=team_id, **totals.get(team_id, {}))
+             for team_id in Team.objects.values_list('pk', flat=True)]
+    with transaction.atomic():
+        TeamStats.objects.all().delete()
+        TeamStats.objects.bulk_create(stats, batch_size=batch_size)
+    return len(stats)
+
+
+def team_stats(team):
+    """
+    :param team: team to get the totals of
+    :return: the team's TeamStats, counted now if it is missing
+    """
+    try:
+        return team.stats
+    except TeamStats.DoesNotExist:
+        refresh_team_stats([team.pk])
+        return TeamStats.objects.get(team_id=team.pk)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class SchedulerConfig(AppConfig):
     name = 'scheduler'
+
+    def ready(self):
+        # connects the signal handlers
+        from scheduler import signals  # noqa: F401
@@ -0,0 +1,253 @@
+"""
+Helpers for the compact availability representation stored on each Player.
+
+A player's week is stored as a 168 bit mask in Player.availability_mask where
+bit (day * 24 + hour) is set when the player is free during that TimeSlot.
+The TimeSlot.players_available table is still written so existing queries
+keep working. Use save_availability to change a player's week and both
+representations will be updated together.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+
+from scheduler import pages
+from scheduler.models import Player, TimeSlot
+
+HOURS_PER_DAY = 24
+SLOTS_PER_WEEK = 7 * HOURS_PER_DAY
+MASK_BYTES = SLOTS_PER_WEEK // 8
+FULL_WEEK = (1 << SLOTS_PER_WEEK) - 1
+
+# slot index -> timeSlotID. The 168 TimeSlot rows are created by the
+# load_times migration and never change, so this is only loaded once.
+_slot_ids = {}
+
+# the account page's table of slots, one row per hour with a
+# (slot index, timeSlotID) pair for each day. Built from _slot_ids once.
+_grid = []
+
+
+def slot_index(day, hour):
+    """
+    Converts a day of the week and an hour into a bit position
+
+    :param day: day of the week, 0 (Monday) to 6 (Sunday)
+    :param hour: hour of the day, 0 to 23
+    :return: bit position of the slot in an availability mask
+    """
+    return day * HOURS_PER_DAY + hour
+
+
+def next_slot_time(index, start):
+    """
+    Finds the next time a weekly slot happens
+
+    :param index: slot index from slot_index
+    :param start: datetime to start searching from
+    :return: datetime of the slot's next occurrence after start
+    """
+    day, hour = divmod(index, HOURS_PER_DAY)
+    time = start.replace(hour=hour, minute=0, second=0, microsecond=0) + \
+        timedelta(days=(day - start.weekday()) % 7)
+    if time <= start:
+        time += timedelta(days=7)
+    return time
+
+
+def mask_to_bytes(mask):
+    """
+    :param mask: availability as an integer
+    :return: bytes to store in Player.availability_mask
+    """
+    return (mask & FULL_WEEK).to_bytes(MASK_BYTES, 'little')
+
+
+def mask_from_bytes(value):
+    """
+    :param value: stored Player.availability_mask (bytes or memoryview)
+    :return: availability as an integer
+    """
+    if not value:
+        return 0
+    return int.from_bytes(bytes(value), 'little')
+
+
+def get_mask(player):
+    """
+    :param player: player to read availability of
+    :return: player's availability as an integer without querying
+    """
+    return mask_from_bytes(player.availability_mask)
+
+
+def mask_from_slots(indices):
+    """
+    :param indices: iterable of slot indices
+    :return: availability mask with each of the slots set
+    """
+    mask = 0
+    for index in indices:
+        mask |= 1 << index
+    return mask
+
+
+def slots_in_mask(mask):
+    """
+    :param mask: availability mask
+    :return: list of the slot indices set in the mask in week order
+    """
+    indices = []
+    index = 0
+    while mask:
+        if mask & 1:
+            indices.append(index)
+        mask >>= 1
+        index += 1
+    return indices
+
+
+def count_slots(mask):
+    """
+    :param mask: availability mask
+    :return: number of slots set in the mask
+    """
+    return bin(mask).count('1')
+
+
+def slot_ids():
+    """
+    :return: dict mapping each slot index to its timeSlotID
+    """
+    if len(_slot_ids) != SLOTS_PER_WEEK:
+        _slot_ids.clear()
+        for pk, day, hour in TimeSlot.objects.values_list(
+                'timeSlotID', 'dayOfWeek', 'hour'):
+            _slot_ids[slot_index(day, hour)] = pk
+    return _slot_ids
+
+
+def grid_skeleton():
+    """
+    :return: list of 24 rows, one per hour, each a tuple of
+        (slot index, timeSlotID) from Monday to Sunday
+    """
+    if not _grid:
+        ids = slot_ids()
+        rows = [tuple((slot_index(day, hour), ids.get(slot_index(day, hour)))
+                      for day in range(7))
+                for hour in range(HOURS_PER_DAY)]
+        # don't keep a grid with missing slots
+        if len(ids) != SLOTS_PER_WEEK:
+            return rows
+        _grid.extend(rows)
+    return _grid
+
+
+def availability_grid(mask):
+    """
+    Fills in the cached grid with a player's availability
+
+    :param mask: the player's availability mask
+    :return: list of 24 dicts with the 'hour' and the 'slots' for each day,
+        every slot a dict with its timeSlotID ('id') and whether the player
+        is free ('available')
+    """
+    return [{
+        'hour': hour,
+        'slots': [{'id': pk, 'available': bool(mask >> index & 1)}
+                  for index, pk in row],
+    } for hour, row in enumerate(grid_skeleton())]
+
+
+def mask_from_slot_ids(timeslot_ids):
+    """
+    Converts submitted timeSlotIDs into an availability mask using the
+    cached slot ids instead of looking each one up.
+
+    :param timeslot_ids: iterable of timeSlotIDs, as ints or strings
+    :return: availability mask with each of the slots set
+    :raises ValueError: if an id is not one of the 168 TimeSlots
+    """
+    indices = {pk: index for index, pk in slot_ids().items()}
+    mask = 0
+    for pk in timeslot_ids:
+        try:
+            mask |= 1 << indices[int(pk)]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Unknown time slot: %r" % (pk,))
+    return mask
+
+
+def timeslots_for_mask(mask):
+    """
+    :param mask: availability mask
+    :return: queryset of the TimeSlots in the mask ordered by day and hour
+    """
+    ids = slot_ids()
+    return TimeSlot.objects.filter(
+        timeSlotID__in=[ids[index] for index in slots_in_mask(mask)
+                        if index in ids]).order_by('dayOfWeek', 'hour')
+
+
+def masks_from_slots(player_pks):
+    """
+    Rebuilds availability masks from TimeSlot.players_available in a
+    single query.
+
+    :param player_pks: battlenetIDs of the players to rebuild
+    :return: dict of battlenetID to availability mask
+    """
+    masks = dict.fromkeys(player_pks, 0)
+    rows = TimeSlot.players_available.through.objects.filter(
+        player_id__in=masks).values_list(
+            'player_id', 'timeslot__dayOfWeek', 'timeslot__hour')
+    for pk, day, hour in rows:
+        masks[pk] |= 1 << slot_index(day, hour)
+    return masks
+
+
+def refresh_masks(player_pks):
+    """
+    Copies TimeSlot.players_available into Player.availability_mask for the
+    given players.
+
+    :param player_pks: battlenetIDs of the players to refresh
+    :return: dict of battlenetID to the saved availability mask
+    """
+    masks = masks_from_slots(player_pks)
+    for pk, mask in masks.items():
+        Player.objects.filter(pk=pk).update(
+            availability_mask=mask_to_bytes(mask))
+    return masks
+
+
+def save_availability(player, mask):
+    """
+    Saves a player's week to both Player.availability_mask and
+    TimeSlot.players_available. Only the slots that changed are written to
+    the join table.
+
+    :param player: player whose availability is changing
+    :param mask: the player's new availability mask
+    """
+    mask &= FULL_WEEK
+    ids = slot_ids()
+    through = TimeSlot.players_available.through
+    with transaction.atomic():
+        old_mask = masks_from_slots([player.pk])[player.pk]
+        removed = slots_in_mask(old_mask & ~mask)
+        if removed:
+            through.objects.filter(
+                player_id=player.pk,
+                timeslot_id__in=[ids[index] for index in removed]).delete()
+        added = slots_in_mask(mask & ~old_mask)
+        if added:
+            through.objects.bulk_create(
+                [through(player_id=player.pk, timeslot_id=ids[index])
+                 for index in added])
+        player.availability_mask = mask_to_bytes(mask)
+        Player.objects.filter(pk=player.pk).update(
+            availability_mask=player.availability_mask)
+    # the join table was written in bulk, which skips the signals
+    pages.forget_pages()
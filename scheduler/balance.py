@@ -0,0 +1,247 @@
+"""
+Splits a pool of players into two sides for a scrim. Each side gets the same
+role composition (two tanks, two damage, two support by default) and the
+difference between the sides' total SR is kept as small as possible. Players
+that aren't picked sit out.
+
+Small pools are solved exactly. For every role, each way of picking that
+role's players for both sides gives an SR difference; the differences of all
+but the last role are combined and the last role's closest counterpart is
+found with a binary search. Pools with too many combinations use a local
+search that swaps players between the sides and the bench from several
+starting points.
+
+Players without a role only fill roles that are short of players, highest
+SR first, and the rest sit out without being tried. The answer isn't
+reported as exact when that happens.
+"""
+import random
+import time
+from bisect import bisect_left
+from itertools import combinations
+
+from scheduler.overlap import ROLE_SLOTS
+
+# largest number of combined differences and splits of the last role
+# searched exactly
+EXACT_LIMIT = 200000
+
+# starting points tried by the local search
+RESTARTS = 20
+
+# seconds the local search may run for
+TIME_LIMIT = 0.5
+
+
+def _role_pools(players, roles, ratings):
+    """
+    Groups the positions of players by role. Players without one of the
+    roles are used to fill roles that don't have enough players, highest SR
+    first.
+
+    :raises ValueError: if there aren't enough players for both sides
+    """
+    pools = {role: [] for role in roles}
+    flex = []
+    for position, player in enumerate(players):
+        if player.role in pools:
+            pools[player.role].append(position)
+        else:
+            flex.append(position)
+    flex.sort(key=lambda position: -ratings[position])
+    for role, need in roles.items():
+        while len(pools[role]) < 2 * need and flex:
+            pools[role].append(flex.pop(0))
+        if len(pools[role]) < 2 * need:
+            raise ValueError("Not enough %s players for two sides." % role)
+    return pools
+
+
+def _role_splits(pool, need, ratings):
+    """
+    :return: dict of SR difference (side 1 - side 2) to one (side 1, side 2)
+        pick of need players each from the pool
+    """
+    splits = {}
+    for picked in combinations(range(len(pool)), 2 * need):
+        for side_1 in combinations(picked, need):
+            side_2 = tuple(index for index in picked if index not in side_1)
+            difference = sum(ratings[pool[index]] for index in side_1) - \
+                sum(ratings[pool[index]] for index in side_2)
+            if difference not in splits:
+                splits[difference] = (side_1, side_2)
+    return splits
+
+
+def _split_count(size, need):
+    """ number of ways to pick need players for each side from size """
+    count = 1
+    for i in range(2 * need):
+        count = count * (size - i) // (i + 1)
+    for i in range(need):
+        count = count * (2 * need - i) // (i + 1)
+    return count
+
+
+def _exact(pools, roles, ratings):
+    """
+    Tries every split, combining the roles' differences
+
+    :return: dict of role to (side 1 indices, side 2 indices)
+    """
+    order = sorted(roles, key=lambda role: len(pools[role]))
+    splits = [_role_splits(pools[role], roles[role], ratings)
+              for role in order]
+
+    # every combined difference of the roles but the last
+    combined = {0: ()}
+    for role_splits in splits[:-1]:
+        combined_next = {}
+        for difference, picks in combined.items():
+            for role_difference, pick in role_splits.items():
+                total = difference + role_difference
+                if total not in combined_next:
+                    combined_next[total] = picks + (pick,)
+        combined = combined_next
+
+    totals = sorted(combined)
+    best = None
+    for difference, pick in splits[-1].items():
+        position = bisect_left(totals, -difference)
+        for candidate in totals[max(position - 1, 0):position + 1]:
+            score = abs(candidate + difference)
+            if best is None or score < best[0]:
+                best = (score, combined[candidate] + (pick,))
+        if best[0] == 0:
+            break
+    return dict(zip(order, best[1]))
+
+
+def _local_search(pools, roles, ratings, rng):
+    """
+    Improves a random split by swapping players until no swap helps
+
+    :return: dict of role to (side 1 indices, side 2 indices) and the SR
+        difference
+    """
+    sides = {}
+    for role, need in roles.items():
+        picked = rng.sample(range(len(pools[role])), 2 * need)
+        sides[role] = [picked[:need], picked[need:],
+                       [index for index in range(len(pools[role]))
+                        if index not in picked]]
+
+    def total(role, group):
+        return sum(ratings[pools[role][index]] for index in group)
+
+    difference = sum(total(role, groups[0]) - total(role, groups[1])
+                     for role, groups in sides.items())
+    improved = True
+    while improved and difference:
+        improved = False
+        best = (abs(difference), None)
+        for role, groups in sides.items():
+            pool = pools[role]
+            # swap players between the two sides
+            for i, first in enumerate(groups[0]):
+                for j, second in enumerate(groups[1]):
+                    change = 2 * (ratings[pool[second]] -
+                                  ratings[pool[first]])
+                    if abs(difference + change) < best[0]:
+                        best = (abs(difference + change),
+                                (role, 0, i, 1, j, change))
+            # swap a player on a side with one sitting out
+            for side, sign in ((0, 1), (1, -1)):
+                for i, playing in enumerate(groups[side]):
+                    for j, bench in enumerate(groups[2]):
+                        change = sign * (ratings[pool[bench]] -
+                                         ratings[pool[playing]])
+                        if abs(difference + change) < best[0]:
+                            best = (abs(difference + change),
+                                    (role, side, i, 2, j, change))
+        if best[1] is not None:
+            role, side, i, other, j, change = best[1]
+            groups = sides[role]
+            groups[side][i], groups[other][j] = \
+                groups[other][j], groups[side][i]
+            difference += change
+            improved = True
+    return {role: (tuple(groups[0]), tuple(groups[1]))
+            for role, groups in sides.items()}, difference
+
+
+def _heuristic(pools, roles, ratings, seed):
+    rng = random.Random(seed)
+    began = time.perf_counter()
+    best = None
+    for _ in range(RESTARTS):
+        picks, difference = _local_search(pools, roles, ratings, rng)
+        if best is None or abs(difference) < abs(best[1]):
+            best = (picks, difference)
+        if not difference or time.perf_counter() - began > TIME_LIMIT:
+            break
+    return best[0]
+
+
+def balance_teams(players, roles=None, seed=0):
+    """
+    Splits players into two sides with the same roles and close total SR.
+    Players without an SR are counted at the pool's average.
+
+    :param players: iterable of players with role and skillRating
+    :param roles: dict of role to the number of players per side, defaults
+        to two of each role
+    :param seed: seed for the local search used on large pools
+    :return: dict with the players on each side ('side_1', 'side_2'), the
+        players sitting out ('bench'), the total SR of each side
+        ('sr_1', 'sr_2'), the difference ('difference'), whether the
+        answer is the best possible ('exact', never when players without a
+        role sat out), and the time taken in seconds ('seconds')
+    :raises ValueError: if there aren't enough players for both sides
+    """
+    began = time.perf_counter()
+    if roles is None:
+        roles = ROLE_SLOTS
+    players = list(players)
+    known = [player.skillRating for player in players
+             if player.skillRating is not None]
+    default = sum(known) // len(known) if known else 0
+    ratings = [player.skillRating if player.skillRating is not None
+               else default for player in players]
+    pools = _role_pools(players, roles, ratings)
+
+    # the other roles' differences are combined, the last role's splits
+    # are only listed, but both are built in full
+    order = sorted(roles, key=lambda role: len(pools[role]))
+    combined = 1
+    for role in order[:-1]:
+        combined *= _split_count(len(pools[role]), roles[role])
+    exact = combined + _split_count(len(pools[order[-1]]),
+                                    roles[order[-1]]) <= EXACT_LIMIT
+    if exact:
+        picks = _exact(pools, roles, ratings)
+    else:
+        picks = _heuristic(pools, roles, ratings, seed)
+    # players without a role that weren't needed to fill a role sit out
+    # without being tried, so a better split might use them
+    if sum(len(pool) for pool in pools.values()) < len(players):
+        exact = False
+
+    side_1 = [pools[role][index] for role in roles
+              for index in picks[role][0]]
+    side_2 = [pools[role][index] for role in roles
+              for index in picks[role][1]]
+    playing = set(side_1) | set(side_2)
+    sr_1 = sum(ratings[position] for position in side_1)
+    sr_2 = sum(ratings[position] for position in side_2)
+    return {
+        'side_1': [players[position] for position in side_1],
+        'side_2': [players[position] for position in side_2],
+        'bench': [player for position, player in enumerate(players)
+                  if position not in playing],
+        'sr_1': sr_1,
+        'sr_2': sr_2,
+        'difference': abs(sr_1 - sr_2),
+        'exact': exact,
+        'seconds': time.perf_counter() - began,
+    }
@@ -0,0 +1,375 @@
+"""
+Benchmarks of the busiest scheduler pages on a generated league. The tests
+in scheduler.tests build two or three players each, so this is where the
+views are timed with thousands of players.
+
+generate_league fills the database with players, teams, availability, and
+matches from a seed, so every run with the same arguments times the same
+data. run_benchmark generates a league of each size, requests every view in
+BENCHMARKS several times with the test client, and reports the percentiles
+of the wall time and the queries run. Each league is rolled back after it is
+timed.
+
+Use the benchmark command to run this on a throwaway database and save the
+results as json to compare with a later run:
+
+    python manage.py benchmark --sizes 100,1000 --output before.json
+    python manage.py benchmark --sizes 100,1000 --compare before.json
+"""
+import math
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from scheduler import availability, matchmaking, membership, pages, \
+    search
+from scheduler.aggregates import rebuild_team_stats
+from scheduler.models import Match, Player, Team, TimeSlot
+
+# views timed, in the order they are run
+BENCHMARKS = ('team_profile', 'my_teams', 'calendar_feed', 'account_save',
+              'players', 'teams', 'player_autocomplete', 'team_autocomplete')
+
+# days before and after today the calendar_feed benchmark asks for, about
+# the six weeks a month view of the calendar shows
+CALENDAR_DAYS = 21
+
+# default league shape: teams per player, roster size, fraction of the week
+# players are free, and matches each team plays
+TEAMS_PER_PLAYER = 0.125
+ROSTER_SIZE = 8
+DENSITY = 0.25
+MATCHES_PER_TEAM = 4
+
+# requests timed for each view, after one untimed request
+REPEATS = 20
+
+# how likely a player is to be free in each part of the day, relative to
+# the rest of the day
+HOUR_WEIGHTS = [0.2] * 8 + [0.6] * 9 + [2.0] * 6 + [1.0]
+
+# pieces that names are made from
+SYLLABLES = ('ana', 'bas', 'dva', 'gen', 'han', 'jun', 'kai', 'lu', 'mei',
+             'mer', 'ora', 'pha', 'rei', 'sol', 'tor', 'tra', 'win', 'zar',
+             'zen', 'ya')
+
+# every generated player has this password
+PASSWORD = 'benchmark'
+
+# run_benchmark keeps membership lookups and pages here instead of the
+# site's cache, which can be shared with the running site
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'owscheduler-benchmark',
+    },
+}
+
+
+def _name(rng, parts):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(parts)).title()
+
+
+def slot_chances(density):
+    """
+    :param density: fraction of the week a player is free on average
+    :return: list of the chance a player is free in each slot, busier in the
+        evenings and on weekends
+    """
+    weights = []
+    for day in range(7):
+        weekend = 1.5 if day >= 5 else 1.0
+        weights += [weight * weekend for weight in HOUR_WEIGHTS]
+    mean = sum(weights) / len(weights)
+    return [min(1.0, density * weight / mean) for weight in weights]
+
+
+def random_mask(rng, chances):
+    """
+    :param rng: random.Random to draw from
+    :param chances: list from slot_chances
+    :return: availability mask with each slot set at its chance
+    """
+    mask = 0
+    for index, chance in enumerate(chances):
+        if rng.random() < chance:
+            mask |= 1 << index
+    return mask
+
+
+def generate_league(players, teams=None, density=DENSITY,
+                    matches_per_team=MATCHES_PER_TEAM,
+                    roster_size=ROSTER_SIZE, seed=0):
+    """
+    Adds a league of players, teams, and matches to the database in bulk.
+    The generated rows skip the save signals, so the availability masks and
+    team totals are written here and the process caches are cleared.
+
+    :param players: number of players
+    :param teams: number of teams, defaults to one for every eight players
+    :param density: fraction of the week players are free on average
+    :param matches_per_team: matches each team is scheduled to play
+    :param roster_size: players on each team
+    :param seed: seed of the generated data
+    :return: dict of the players, teams, and matches created
+    """
+    rng = random.Random(seed)
+    if teams is None:
+        teams = max(2, int(players * TEAMS_PER_PLAYER))
+    password = make_password(PASSWORD)
+    chances = slot_chances(density)
+    roles = [role for role, _ in Player.ROLE_CHOICES] + [None]
+
+    masks = [random_mask(rng, chances) for _ in range(players)]
+    new_players = [Player(
+        username='player%d' % i,
+        battlenetID='%s%d#%d' % (_name(rng, 2), i, rng.randint(1000, 99999)),
+        password=password,
+        role=rng.choice(roles),
+        skillRating=min(4800, max(500, int(rng.gauss(2500, 600)))),
+        university=Player.GVSU if rng.random() < 0.5 else None,
+        availability_mask=availability.mask_to_bytes(mask),
+    ) for i, mask in enumerate(masks)]
+    Player.objects.bulk_create(new_players)
+
+    ids = availability.slot_ids()
+    through = TimeSlot.players_available.through
+    through.objects.bulk_create(
+        [through(player_id=player.pk, timeslot_id=ids[index])
+         for player, mask in zip(new_players, masks)
+         for index in availability.slots_in_mask(mask)])
+
+    first_id = (Team.objects.order_by('-teamID').
+                values_list('teamID', flat=True).first() or 0) + 1
+    rosters = [rng.sample(new_players, min(roster_size, players))
+               for _ in range(teams)]
+    new_teams = [Team(
+        teamID=first_id + i,
+        teamAlias='%s %s' % (_name(rng, 2), _name(rng, 1)),
+        team_admin=roster[0],
+        organization=Player.GVSU if rng.random() < 0.5 else None,
+    ) for i, roster in enumerate(rosters)]
+    Team.objects.bulk_create(new_teams)
+    Team.players.through.objects.bulk_create(
+        [Team.players.through(team_id=team.pk, player_id=player.pk)
+         for team, roster in zip(new_teams, rosters) for player in roster])
+    rebuild_team_stats()
+
+    now = timezone.now().replace(minute=0, second=0, microsecond=0)
+    new_matches = []
+    for position, team in enumerate(new_teams):
+        for _ in range(matches_per_team):
+            # any team but this one
+            other = rng.randrange(len(new_teams) - 1)
+            new_matches.append(Match(
+                team_1=team,
+                team_2=new_teams[other + (other >= position)],
+                time=now + timedelta(hours=rng.randrange(-24 * 28, 24 * 28)),
+                matchMap=rng.choice(Match.MAP_CHOICES)[0],
+            ))
+    Match.objects.bulk_create(new_matches)
+
+    league = {'players': new_players, 'teams': new_teams,
+              'matches': new_matches}
+    reset_caches(league)
+    return league
+
+
+def reset_caches(league=None):
+    """
+    Clears the process caches and the cached pages. Only the membership
+    lookups of the league's rows are removed, so nothing else in a shared
+    cache is lost.
+
+    :param league: dict from generate_league whose rows changed
+    """
+    search._indexes.clear()
+    search.results.clear()
+    matchmaking._indexes.clear()
+    if league is not None:
+        membership.forget_teams([team.pk for team in league['teams']])
+        membership.forget_players(
+            [player.pk for player in league['players']], admin=True)
+    pages.forget_pages()
+
+
+def percentile(values, fraction):
+    """
+    :param values: sorted list of numbers
+    :param fraction: percentile wanted between 0 and 1
+    :return: the nearest ranked value
+    """
+    if not values:
+        return None
+    rank = max(1, math.ceil(fraction * len(values)))
+    return values[rank - 1]
+
+
+def summarize(times, queries):
+    """
+    :param times: seconds each request took
+    :param queries: queries each request ran
+    :return: dict of the percentiles in milliseconds and query counts
+    """
+    times = sorted(seconds * 1000 for seconds in times)
+    queries = sorted(queries)
+    return {
+        'requests': len(times),
+        'mean_ms': sum(times) / len(times),
+        'p50_ms': percentile(times, 0.5),
+        'p95_ms': percentile(times, 0.95),
+        'max_ms': times[-1],
+        'queries': percentile(queries, 0.5),
+        'max_queries': queries[-1],
+    }
+
+
+def _requests(league, rng):
+    """
+    :return: dict of benchmark name to a function making one request with
+        the client, and the player to log in as
+    """
+    team = league['teams'][0]
+    player = team.team_admin
+    slots = list(availability.slot_ids().values())
+    players = [other.battlenetID for other in league['players']]
+    teams = [other.teamAlias for other in league['teams']]
+    today = timezone.now().date()
+    window = {'start': (today - timedelta(days=CALENDAR_DAYS)).isoformat(),
+              'end': (today + timedelta(days=CALENDAR_DAYS)).isoformat()}
+
+    def prefix(names):
+        return rng.choice(names)[:rng.randint(2, 4)]
+
+    return player, {
+        'team_profile': lambda client: client.get(reverse(
+            'scheduler:team_profile', kwargs={'teamID': team.pk})),
+        'my_teams': lambda client: client.get(reverse(
+            'scheduler:my_teams', kwargs={'username': player.username})),
+        'calendar_feed': lambda client: client.get(reverse(
+            'scheduler:calendar_feed', kwargs={'username': player.username}),
+            window),
+        'account_save': lambda client: client.post(reverse(
+            'scheduler:account', kwargs={'username': player.username}), {
+                'set-availability': '',
+                'availability': rng.sample(slots, rng.randint(20, 60))}),
+        'players': lambda client: client.get(reverse('scheduler:players')),
+        'teams': lambda client: client.get(reverse('scheduler:teams')),
+        'player_autocomplete': lambda client: client.get(
+            reverse('player-autocomplete'), {'q': prefix(players)}),
+        'team_autocomplete': lambda client: client.get(
+            reverse('team-autocomplete'), {'q': prefix(teams)}),
+    }
+
+
+def time_views(league, repeats=REPEATS, seed=0, names=BENCHMARKS):
+    """
+    Requests each view repeats times after one untimed request
+
+    :param league: dict from generate_league
+    :param repeats: timed requests of each view
+    :param seed: seed of the searches and availability saved
+    :param names: benchmarks to run
+    :return: dict of benchmark name to the dict from summarize
+    """
+    rng = random.Random(seed)
+    player, requests = _requests(league, rng)
+    client = Client()
+    client.force_login(player)
+    results = {}
+    for name in names:
+        request = requests[name]
+        request(client)
+        times, queries = [], []
+        for _ in range(repeats):
+            with CaptureQueriesContext(connection) as captured:
+                began = time.perf_counter()
+                response = request(client)
+                times.append(time.perf_counter() - began)
+            if response.status_code >= 400:
+                raise RuntimeError("%s returned %d" % (
+                    name, response.status_code))
+            queries.append(len(captured))
+        results[name] = summarize(times, queries)
+    return results
+
+
+def run_benchmark(sizes, repeats=REPEATS, seed=0, density=DENSITY,
+                  matches_per_team=MATCHES_PER_TEAM, names=BENCHMARKS):
+    """
+    Times the views on a league of each size. Each league is rolled back
+    once it has been timed. The views use a private local memory cache
+    (BENCHMARK_CACHES) so the site's cache is never changed.
+
+    :param sizes: numbers of players to generate leagues of
+    :param repeats: timed requests of each view
+    :param seed: seed of the generated data and requests
+    :param density: fraction of the week players are free on average
+    :param matches_per_team: matches each team is scheduled to play
+    :param names: benchmarks to run
+    :return: dict of the settings used and a result for each size
+    """
+    results = []
+    for size in sizes:
+        with override_settings(CACHES=BENCHMARK_CACHES), \
+                transaction.atomic():
+            began = time.perf_counter()
+            league = generate_league(size, density=density,
+                                     matches_per_team=matches_per_team,
+                                     seed=seed)
+            generated = time.perf_counter() - began
+            results.append({
+                'players': size,
+                'teams': len(league['teams']),
+                'matches': len(league['matches']),
+                'generate_seconds': generated,
+                'views': time_views(league, repeats, seed, names),
+            })
+            transaction.set_rollback(True)
+            reset_caches(league)
+    return {
+        'seed': seed,
+        'repeats': repeats,
+        'density': density,
+        'matches_per_team': matches_per_team,
+        'database': connection.vendor,
+        'run_at': timezone.now().isoformat(),
+        'sizes': results,
+    }
+
+
+def compare(before, after):
+    """
+    :param before: dict from an earlier run_benchmark
+    :param after: dict from run_benchmark
+    :return: list of dicts with the players, view, median time and queries
+        of both runs, and the change in median time as a fraction, for the
+        sizes and views both runs have
+    """
+    earlier = {(size['players'], name): view
+               for size in before['sizes']
+               for name, view in size['views'].items()}
+    rows = []
+    for size in after['sizes']:
+        for name, view in size['views'].items():
+            old = earlier.get((size['players'], name))
+            if old is None:
+                continue
+            rows.append({
+                'players': size['players'],
+                'view': name,
+                'before_ms': old['p50_ms'],
+                'after_ms': view['p50_ms'],
+                'change': (view['p50_ms'] - old['p50_ms']) / old['p50_ms']
+                if old['p50_ms'] else 0.0,
+                'before_queries': old['queries'],
+                'after_queries': view['queries'],
+            })
+    return rows
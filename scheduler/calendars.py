@@ -0,0 +1,128 @@
+"""
+Builds match calendars for players and teams. This includes the iCalendar
+(.ics) feeds players can subscribe to from their phones. Feeds are opened
+with a token instead of a login since calendar apps can't sign in.
+"""
+from django.db.models import Q, Count, Max
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from scheduler.models import Match, Team
+
+FEED_SALT = 'scheduler.calendars.feed'
+
+# matches don't store a length, so every event is an hour long
+MATCH_LENGTH = 'PT1H'
+
+
+def feed_token(kind, key):
+    """
+    :param kind: 'player' or 'team'
+    :param key: username or teamID the feed belongs to
+    :return: token to put in the feed's url
+    """
+    return salted_hmac(FEED_SALT, '%s:%s' % (kind, key)).hexdigest()[:32]
+
+
+def check_feed_token(kind, key, token):
+    """
+    :return: True if token is the feed token for the player or team
+    """
+    return constant_time_compare(feed_token(kind, key), token)
+
+
+def player_matches(player, matches=None):
+    """
+    :param player: player to find matches for
+    :param matches: optional queryset of matches to narrow down
+    :return: queryset of matches the player is playing in, their teams are
+        playing in, or that are for a team they admin
+    """
+    if matches is None:
+        matches = Match.objects.all()
+    teams_playing = Team.objects.filter(players=player)
+    return matches.filter(
+        Q(pk__in=Match.player_set_1.through.objects.filter(
+            player=player).values('match_id')) |
+        Q(pk__in=Match.player_set_2.through.objects.filter(
+            player=player).values('match_id')) |
+        Q(team_1__in=teams_playing) | Q(team_2__in=teams_playing) |
+        Q(team_1__team_admin=player) | Q(team_2__team_admin=player))
+
+
+def team_matches(team):
+    """
+    :param team: team to find matches for
+    :return: queryset of matches the team is playing in
+    """
+    return Match.objects.filter(Q(team_1=team) | Q(team_2=team))
+
+
+def feed_state(matches):
+    """
+    Finds when a feed last changed with one aggregate query. Renaming a
+    team changes the events' titles, so the teams' last_modified counts too.
+
+    :param matches: queryset of matches in the feed
+    :return: tuple of the number of matches and the latest last_modified of
+        the matches and their teams
+    """
+    state = matches.order_by().aggregate(
+        count=Count('pk'), latest=Max('last_modified'),
+        team_1=Max('team_1__last_modified'),
+        team_2=Max('team_2__last_modified'))
+    changed = [state[key] for key in ('latest', 'team_1', 'team_2')
+               if state[key] is not None]
+    return state['count'], max(changed) if changed else None
+
+
+def _escape(text):
+    """ escapes text for an iCalendar property value """
+    return str(text).replace('\\', '\\\\').replace(';', '\\;'). \
+        replace(',', '\\,').replace('\n', '\\n')
+
+
+def _fold(line):
+    """ splits lines longer than 75 characters as required by RFC 5545 """
+    parts = []
+    while len(line) > 75:
+        parts.append(line[:75])
+        line = ' ' + line[75:]
+    parts.append(line)
+    return '\r\n'.join(parts) + '\r\n'
+
+
+def _ics_time(value):
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def ics_lines(matches, name):
+    """
+    Generates an iCalendar feed one line at a time so large calendars can be
+    streamed. Matches are read with an iterator and only the columns needed
+    for each event are loaded.
+
+    :param matches: queryset of matches in the feed
+    :param name: name of the calendar
+    :return: generator of CRLF terminated lines
+    """
+    yield _fold('BEGIN:VCALENDAR')
+    yield _fold('VERSION:2.0')
+    yield _fold('PRODID:-//OWScheduler//Matches//EN')
+    yield _fold('CALSCALE:GREGORIAN')
+    yield _fold('X-WR-CALNAME:' + _escape(name))
+    rows = matches.order_by('time').values_list(
+        'matchID', 'time', 'last_modified', 'matchMap',
+        'team_1__teamAlias', 'team_1_id', 'team_2__teamAlias', 'team_2_id')
+    for match_id, time, modified, match_map, alias_1, team_1, alias_2, \
+            team_2 in rows.iterator():
+        title = '%s#%s vs. %s#%s' % (alias_1, team_1, alias_2, team_2)
+        yield _fold('BEGIN:VEVENT')
+        yield _fold('UID:match-%s@owscheduler' % match_id)
+        yield _fold('DTSTAMP:' + _ics_time(modified or time))
+        yield _fold('DTSTART:' + _ics_time(time))
+        yield _fold('DURATION:' + MATCH_LENGTH)
+        yield _fold('SUMMARY:' + _escape(title))
+        if match_map:
+            yield _fold('LOCATION:' + _escape(match_map))
+        yield _fold('END:VEVENT')
+    yield _fold('END:VCALENDAR')
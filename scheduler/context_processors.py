@@ -0,0 +1,45 @@
+"""
+Template context processors for the scheduler app. These replace building
+the login context in every view, and give templates the version their
+cached fragments are keyed by.
+"""
+from django.utils.functional import SimpleLazyObject
+
+from scheduler import pages
+
+
+def login(request):
+    """
+    Adds the navigation bar's login form and the player's teams to every
+    template. The values are resolved once per request by
+    scheduler.middleware.CurrentPlayerMiddleware.
+
+    :param request: network request info
+    :returns dict containing login form, teams, and teams the user admins.
+        user is None when nobody is logged in
+    """
+    if not hasattr(request, 'player'):
+        return {}
+    context = {
+        'user_teams': request.user_teams,
+        'admin_teams': request.admin_teams,
+        'login_form': request.login_form,
+    }
+    if request.player is None:
+        context['user'] = None
+    return context
+
+
+def page_cache(request):
+    """
+    Adds the version of the cached pages for {% cache %} tags to vary on,
+    so cached tables are replaced when a player or team changes. The
+    version is only looked up by templates that use it.
+
+    :param request: network request info
+    :returns dict containing cache_version and cache_timeout
+    """
+    return {
+        'cache_version': SimpleLazyObject(pages.version),
+        'cache_timeout': pages.page_timeout(),
+    }
@@ -1,22 +1,42 @@
 """
 This module holds all the custom decorators for views that use it.
 This includes ensuring a user has the correct permissions to access certain
-views.
+views, and caching pages for visitors who aren't logged in.
 """
+from django.contrib import messages
 from django.core.exceptions import PermissionDenied
 
-from scheduler.models import Player, Team
+from scheduler import pages
+from scheduler.membership import is_team_admin
 
 
 def is_team_admin_or_superuser(function):
     """
     :returns True if user is the admin of the
-    team from function param or a superuser
+    team from function param or a superuser. Posts check the admin in the
+    database instead of the cache.
     """
     def wrap(request, *args, **kwargs):
-        player = Player.objects.get(username=request.user.username)
-        team = Team.objects.get(pk=kwargs['teamID'])
-        if team.team_admin == player or request.user.is_superuser:
+        if request.user.is_superuser or \
+                is_team_admin(request.player, kwargs['teamID'],
+                              fresh=request.method not in ('GET', 'HEAD')):
+            return function(request, *args, **kwargs)
+        else:
+            raise PermissionDenied
+    wrap.__doc__ = function.__doc__
+    wrap.__name__ = function.__name__
+    return wrap
+
+
+def is_current_team_admin_or_superuser(function):
+    """
+    :returns True if user is the admin of the team from function param in
+    the database, not the cache, or a superuser. For views that change the
+    team on any request.
+    """
+    def wrap(request, *args, **kwargs):
+        if request.user.is_superuser or \
+                is_team_admin(request.player, kwargs['teamID'], fresh=True):
             return function(request, *args, **kwargs)
         else:
             raise PermissionDenied
@@ -39,3 +59,25 @@ def is_user_or_superuser(function):
     wrap.__doc__ = function.__doc__
     wrap.__name__ = function.__name__
     return wrap
+
+
+def cache_for_anonymous(function):
+    """
+    Caches the page for visitors who aren't logged in (see scheduler.pages).
+    Logged in players, posts, and pages with messages to show are never
+    cached.
+    """
+    def wrap(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or \
+                request.user.is_authenticated or \
+                len(messages.get_messages(request)):
+            return function(request, *args, **kwargs)
+        key = pages.page_key(request)
+        response = pages.cached_response(request, key)
+        if response is None:
+            response = function(request, *args, **kwargs)
+            pages.save_response(key, response)
+        return response
+    wrap.__doc__ = function.__doc__
+    wrap.__name__ = function.__name__
+    return wrap
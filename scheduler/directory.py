@@ -0,0 +1,92 @@
+"""
+Paging and filtering for the players and teams directories. Pages are found
+with keyset (cursor) pagination: instead of an OFFSET, each page continues
+after the last key of the previous one, so every page costs the same no
+matter how far into the directory it is.
+"""
+from django.core.exceptions import ValidationError
+
+from scheduler.forms import TeamSearchForm
+
+PAGE_SIZE = 50
+
+
+def keyset_page(queryset, key, after=None, size=PAGE_SIZE):
+    """
+    Gets one page of a queryset ordered by key from highest to lowest
+
+    :param queryset: filtered queryset to page through
+    :param key: unique field to order and page by, such as the primary key
+    :param after: key of the last row on the previous page, or None for the
+        first page. Keys that aren't valid for the field also start from
+        the first page
+    :param size: number of rows on a page
+    :return: dict with the rows on the page ('items'), the cursor for the
+        next page or None if this is the last page ('next')
+    """
+    queryset = queryset.order_by('-' + key)
+    if after not in (None, ''):
+        try:
+            after = queryset.model._meta.get_field(key).to_python(after)
+        except ValidationError:
+            # a cursor that isn't a key starts from the first page
+            after = None
+    if after not in (None, ''):
+        queryset = queryset.filter(**{key + '__lt': after})
+    # one extra row tells us if there is another page without a count
+    rows = list(queryset[:size + 1])
+    more = len(rows) > size
+    rows = rows[:size]
+    return {
+        'items': rows,
+        'next': getattr(rows[-1], key) if more else None,
+    }
+
+
+def filter_players(queryset, filters):
+    """
+    :param queryset: players to filter
+    :param filters: cleaned data from forms.PlayerSearchForm
+    :return: queryset narrowed by the filters that were filled in
+    """
+    if filters.get('search'):
+        queryset = queryset.filter(
+            battlenetID__istartswith=filters['search'])
+    if filters.get('role'):
+        queryset = queryset.filter(role=filters['role'])
+    if filters.get('university'):
+        queryset = queryset.filter(university=filters['university'])
+    if filters.get('sr_min') is not None:
+        queryset = queryset.filter(skillRating__gte=filters['sr_min'])
+    if filters.get('sr_max') is not None:
+        queryset = queryset.filter(skillRating__lte=filters['sr_max'])
+    return queryset
+
+
+def filter_teams(queryset, filters):
+    """
+    :param queryset: teams to filter
+    :param filters: cleaned data from forms.TeamSearchForm
+    :return: queryset narrowed by the filters that were filled in
+    """
+    status = filters.get('status') or TeamSearchForm.ACTIVE
+    if status != TeamSearchForm.ALL:
+        queryset = queryset.filter(is_active=status == TeamSearchForm.ACTIVE)
+    if filters.get('organization'):
+        queryset = queryset.filter(organization=filters['organization'])
+    if filters.get('search'):
+        queryset = queryset.filter(teamAlias__istartswith=filters['search'])
+    return queryset
+
+
+def next_page_query(params, cursor):
+    """
+    :param params: QueryDict of the current page's GET parameters
+    :param cursor: 'next' from keyset_page
+    :return: url encoded query string for the next page, or None
+    """
+    if cursor is None:
+        return None
+    params = params.copy()
+    params['after'] = cursor
+    return params.urlencode()
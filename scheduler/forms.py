@@ -219,3 +219,49 @@ class MatchCreationForm(forms.ModelForm):
             # 'player_set_2',
             # 'winner'
         )
+
+
+class PlayerSearchForm(forms.Form):
+    """ Filters for the players directory. Every field is optional. """
+    search = forms.CharField(max_length=64, required=False,
+                             label="BattleTag starts with")
+    role = forms.ChoiceField(choices=(('', 'Any'),) + Player.ROLE_CHOICES,
+                             required=False)
+    university = forms.ChoiceField(
+        choices=(('', 'Any'),) + Player.UNIVERSITY_CHOICES, required=False)
+    sr_min = forms.IntegerField(min_value=0, required=False,
+                                label="Minimum SR")
+    sr_max = forms.IntegerField(min_value=0, required=False,
+                                label="Maximum SR")
+
+    def clean(self):
+        """
+        Checks the SR range isn't backwards
+
+        :return: cleaned filters
+        """
+        cleaned_data = super(PlayerSearchForm, self).clean()
+        sr_min = cleaned_data.get('sr_min')
+        sr_max = cleaned_data.get('sr_max')
+        if sr_min is not None and sr_max is not None and sr_min > sr_max:
+            raise ValidationError("Minimum SR can't be more than maximum SR.")
+        return cleaned_data
+
+
+class TeamSearchForm(forms.Form):
+    """ Filters for the teams directory. Only active teams are shown unless
+    another status is picked. """
+    ACTIVE = 'active'
+    INACTIVE = 'inactive'
+    ALL = 'all'
+
+    STATUS_CHOICES = (
+        (ACTIVE, 'Active'),
+        (INACTIVE, 'Inactive'),
+        (ALL, 'All'),
+    )
+
+    search = forms.CharField(max_length=32, required=False,
+                             label="Name starts with")
+    organization = forms.CharField(max_length=50, required=False)
+    status = forms.ChoiceField(choices=STATUS_CHOICES, required=False)
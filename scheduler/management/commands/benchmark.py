@@ -0,0 +1,89 @@
+"""
+Times the busiest scheduler views on generated leagues (see
+scheduler.benchmark). The leagues are made in a new test database, so the
+real data is never touched:
+
+    python manage.py benchmark --sizes 100,1000,5000 --output after.json
+    python manage.py benchmark --compare before.json
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, teardown_databases
+
+from scheduler import benchmark
+
+
+class Command(BaseCommand):
+    help = "Times the scheduler views on generated leagues"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000',
+                            help="comma separated numbers of players")
+        parser.add_argument('--repeats', type=int,
+                            default=benchmark.REPEATS,
+                            help="timed requests of each view")
+        parser.add_argument('--seed', type=int, default=0,
+                            help="seed of the generated leagues")
+        parser.add_argument('--density', type=float,
+                            default=benchmark.DENSITY,
+                            help="fraction of the week players are free")
+        parser.add_argument('--matches', type=int,
+                            default=benchmark.MATCHES_PER_TEAM,
+                            help="matches each team plays")
+        parser.add_argument('--views', default=','.join(benchmark.BENCHMARKS),
+                            help="comma separated benchmarks to run")
+        parser.add_argument('--output', help="file to save the results to")
+        parser.add_argument('--compare',
+                            help="results of an earlier run to compare with")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="slowdown reported as a regression")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError("--sizes must be numbers like 100,1000")
+        names = options['views'].split(',')
+        unknown = set(names) - set(benchmark.BENCHMARKS)
+        if unknown:
+            raise CommandError("Unknown benchmarks: %s" %
+                               ', '.join(sorted(unknown)))
+
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = benchmark.run_benchmark(
+                sizes, options['repeats'], options['seed'],
+                options['density'], options['matches'], names)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        self.stdout.write("%8s %-20s %9s %9s %9s %8s" % (
+            'players', 'view', 'p50 ms', 'p95 ms', 'max ms', 'queries'))
+        for size in results['sizes']:
+            for name, view in size['views'].items():
+                self.stdout.write("%8d %-20s %9.1f %9.1f %9.1f %8d" % (
+                    size['players'], name, view['p50_ms'], view['p95_ms'],
+                    view['max_ms'], view['queries']))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                "Saved to %s" % options['output']))
+
+        if options['compare']:
+            with open(options['compare']) as before:
+                rows = benchmark.compare(json.load(before), results)
+            for row in rows:
+                line = "%8d %-20s %9.1f -> %9.1f ms %+6.0f%%  %d -> %d " \
+                       "queries" % (row['players'], row['view'],
+                                    row['before_ms'], row['after_ms'],
+                                    row['change'] * 100,
+                                    row['before_queries'],
+                                    row['after_queries'])
+                if row['change'] > options['threshold'] or \
+                        row['after_queries'] > row['before_queries']:
+                    self.stdout.write(self.style.WARNING(line))
+                else:
+                    self.stdout.write(line)
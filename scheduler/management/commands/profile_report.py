@@ -0,0 +1,51 @@
+"""
+Prints the scheduler views that cost the most, as recorded by the profiling
+middleware (see scheduler.profiling). Totals are read from the cache every
+process saves them to, or from a file saved from /profile-stats/:
+
+    python manage.py profile_report --sort queries --limit 5
+    python manage.py profile_report --file profile.json
+"""
+import json
+
+from django.core.management.base import BaseCommand
+
+from scheduler import profiling
+
+
+class Command(BaseCommand):
+    help = "Prints the slowest scheduler views and repeated queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=sorted(profiling.SORTS),
+                            default='wall',
+                            help="total the views are ranked by")
+        parser.add_argument('--limit', type=int, default=10,
+                            help="views to print")
+        parser.add_argument('--file',
+                            help="json saved from /profile-stats/")
+
+    def handle(self, *args, **options):
+        if options['file']:
+            with open(options['file']) as dump:
+                totals = json.load(dump)['views']
+        else:
+            totals = profiling.merge(profiling.published())
+        rows = profiling.top_offenders(totals, options['sort'],
+                                       options['limit'])
+        if not rows:
+            self.stdout.write("No requests recorded. Is SCHEDULER_PROFILING "
+                              "turned on?")
+            return
+
+        self.stdout.write("%-32s %8s %8s %8s %9s %9s %9s %6s" % (
+            'view', 'requests', 'queries', 'db ms', 'tmpl ms', 'wall ms',
+            'p95 ms', 'n+1'))
+        for row in rows:
+            self.stdout.write("%-32s %8d %8.1f %8.1f %9.1f %9.1f %9.0f %6d" % (
+                row['view'], row['requests'], row['avg_queries'],
+                row['avg_db_ms'], row['avg_template_ms'],
+                row['avg_wall_ms'], row['p95_wall_ms'], row['n_plus_one']))
+            for shape, count in row['repeated'].items():
+                self.stdout.write(self.style.WARNING(
+                    "    %dx %s" % (count, shape[:200])))
@@ -0,0 +1,27 @@
+"""
+Recounts the stored roster totals (TeamStats) of every team. The totals are
+kept up to date as rosters change, so this is only needed after changing
+rosters outside of Django, such as with raw SQL or loaddata:
+
+    python manage.py rebuild_team_stats
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from scheduler.aggregates import rebuild_team_stats
+
+
+class Command(BaseCommand):
+    help = "Recounts the roster size, SR, and roles of every team"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="teams saved per query")
+
+    def handle(self, *args, **options):
+        began = time.perf_counter()
+        count = rebuild_team_stats(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            "%d teams counted, %.3f seconds" % (
+                count, time.perf_counter() - began)))
@@ -0,0 +1,72 @@
+"""
+Schedules a whole league of teams from one organization:
+
+    python manage.py schedule_league GVSU --weeks 8
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from scheduler.models import Team
+from scheduler.overlap import TEAM_SIZE
+from scheduler.scheduler import league_schedule
+
+
+class Command(BaseCommand):
+    help = "Schedules a round robin or swiss league for an organization"
+
+    def add_arguments(self, parser):
+        parser.add_argument('organization',
+                            help="organization of the teams in the league")
+        parser.add_argument('--weeks', type=int, required=True,
+                            help="number of weeks to schedule")
+        parser.add_argument('--style', default='round-robin',
+                            choices=('round-robin', 'swiss'))
+        parser.add_argument('--start',
+                            help="first week starts after this date "
+                                 "(YYYY-MM-DD), defaults to now")
+        parser.add_argument('--minimum', type=int, default=TEAM_SIZE,
+                            help="players per team that need to be free")
+        parser.add_argument('--per-slot', type=int,
+                            help="most matches that can share a time slot")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="report the matches without saving them")
+
+    def handle(self, *args, **options):
+        teams = Team.objects.filter(is_active=True,
+                                    organization=options['organization'])
+        if teams.count() < 2:
+            raise CommandError("%s needs at least two active teams." %
+                               options['organization'])
+
+        start = None
+        if options['start']:
+            try:
+                start = timezone.make_aware(
+                    datetime.strptime(options['start'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError("--start must be a date like 2019-04-15")
+
+        result = league_schedule(teams, options['weeks'], start=start,
+                                 style=options['style'],
+                                 minimum=options['minimum'],
+                                 per_slot=options['per_slot'],
+                                 commit=not options['dry_run'])
+        for match in result['matches']:
+            self.stdout.write("%s: %s vs. %s" % (
+                match.time.strftime('%a %Y-%m-%d %H:%M'),
+                match.team_1_id, match.team_2_id))
+        crowded = set(result['crowded'])
+        for week, team_1, team_2 in result['unscheduled']:
+            if (week, team_1, team_2) in crowded:
+                reason = "every time they have in common is full"
+            else:
+                reason = "they have no time in common"
+            self.stdout.write(self.style.WARNING(
+                "week %d: %s vs. %s not scheduled, %s" % (
+                    week + 1, team_1, team_2, reason)))
+        self.stdout.write(self.style.SUCCESS(
+            "%d matches, %d unscheduled, %.3f seconds" % (
+                len(result['matches']), len(result['unscheduled']),
+                result['seconds'])))
@@ -0,0 +1,40 @@
+"""
+Proposes matches for every active team. This is meant to be run nightly:
+
+    python manage.py schedule_matches
+"""
+from django.core.management.base import BaseCommand
+
+from scheduler.models import Team
+from scheduler.overlap import TEAM_SIZE
+from scheduler.scheduler import no_restriction_schedule
+
+
+class Command(BaseCommand):
+    help = "Schedules matches between teams with enough players free"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization',
+                            help="only schedule teams in this organization")
+        parser.add_argument('--minimum', type=int, default=TEAM_SIZE,
+                            help="players per team that need to be free")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="report the matches without saving them")
+
+    def handle(self, *args, **options):
+        teams = Team.objects.filter(is_active=True)
+        if options['organization']:
+            teams = teams.filter(organization=options['organization'])
+
+        result = no_restriction_schedule(teams,
+                                         minimum=options['minimum'],
+                                         commit=not options['dry_run'])
+        for match in result['matches']:
+            self.stdout.write("%s: %s vs. %s" % (
+                match.time.strftime('%a %Y-%m-%d %H:%M'),
+                match.team_1_id, match.team_2_id))
+        self.stdout.write(self.style.SUCCESS(
+            "%d matches, %d teams unmatched, %d teams already playing this "
+            "week, %.3f seconds" % (
+                len(result['matches']), len(result['unmatched']),
+                len(result['booked']), result['seconds'])))
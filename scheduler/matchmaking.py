@@ -0,0 +1,160 @@
+"""
+Finds good opponents for a team. Opponents are scored by how close their
+average SR is and how many weekly slots both teams have enough players free
+(see scheduler.overlap.team_quorum_masks).
+
+Every active team is kept in an index sorted by average SR with its
+availability as a bit mask. A search starts at the team's own SR and walks
+outwards in both directions, so only teams that could still beat the best
+opponents found so far are looked at. The index is rebuilt with two queries
+once it is older than MATCHMAKING_INDEX_TIMEOUT seconds.
+"""
+import heapq
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from scheduler.availability import count_slots
+from scheduler.models import Team
+from scheduler.overlap import TEAM_SIZE, team_quorum_masks
+
+# one shared slot is worth this much SR difference when scoring opponents
+SR_PER_SLOT = 25
+
+# default for MATCHMAKING_INDEX_TIMEOUT
+INDEX_TIMEOUT = 60
+
+# minimum -> (time built, MatchmakingIndex), at most one per minimum from
+# 1 to TEAM_SIZE
+_indexes = {}
+
+
+class MatchmakingIndex:
+    """
+    Active teams sorted by average SR with the slots each has enough players
+    free. Teams without any SRs are left out.
+    """
+
+    def __init__(self, quorums):
+        """
+        :param quorums: dict from overlap.team_quorum_masks
+        """
+        self.masks = {team_id: quorum['mask']
+                      for team_id, quorum in quorums.items()}
+        self.ratings = sorted((quorum['avg_sr'], team_id)
+                              for team_id, quorum in quorums.items()
+                              if quorum['avg_sr'] is not None)
+
+    def opponents(self, team_id, mask, avg_sr, limit=10, min_shared=1):
+        """
+        Ranks the teams closest in SR that share enough free slots. Lower
+        scores are better: the SR difference minus SR_PER_SLOT for every
+        shared slot.
+
+        :param team_id: teamID of the team looking for opponents
+        :param mask: slots the team has enough players free
+        :param avg_sr: the team's average SR
+        :param limit: most opponents to return
+        :param min_shared: fewest shared slots an opponent needs
+        :return: list of dicts with the teamID, avg_sr, sr_difference,
+            shared_slots, shared mask ('mask'), and score, best first
+        """
+        # no opponent can share more slots than the team has free
+        best_bonus = SR_PER_SLOT * count_slots(mask)
+        below = bisect_left(self.ratings, (avg_sr, team_id)) - 1
+        above = below + 1
+        # max heap of the best opponents so far, as (-score, teamID, entry)
+        best = []
+        while below >= 0 or above < len(self.ratings):
+            if above >= len(self.ratings) or (
+                    below >= 0 and avg_sr - self.ratings[below][0] <=
+                    self.ratings[above][0] - avg_sr):
+                rating, other = self.ratings[below]
+                below -= 1
+            else:
+                rating, other = self.ratings[above]
+                above += 1
+            difference = abs(rating - avg_sr)
+            # every team left is further away in SR
+            if len(best) == limit and \
+                    difference - best_bonus > -best[0][0]:
+                break
+            if other == team_id:
+                continue
+            shared = mask & self.masks[other]
+            shared_slots = count_slots(shared)
+            if shared_slots < min_shared:
+                continue
+            score = difference - SR_PER_SLOT * shared_slots
+            entry = {
+                'teamID': other,
+                'avg_sr': rating,
+                'sr_difference': difference,
+                'shared_slots': shared_slots,
+                'mask': shared,
+                'score': score,
+            }
+            if len(best) < limit:
+                heapq.heappush(best, (-score, -other, entry))
+            elif score < -best[0][0]:
+                heapq.heapreplace(best, (-score, -other, entry))
+        return [entry for _, _, entry in
+                sorted(best, key=lambda item: (-item[0], -item[1]))]
+
+
+def build_index(minimum=TEAM_SIZE):
+    """
+    Loads every active team into a new index with two queries
+
+    :param minimum: players on a team that need to be free in a slot
+    :return: MatchmakingIndex
+    """
+    team_ids = list(Team.objects.filter(is_active=True).
+                    values_list('teamID', flat=True))
+    return MatchmakingIndex(team_quorum_masks(team_ids, minimum))
+
+
+def clamp_minimum(minimum):
+    """
+    :param minimum: players on a team that need to be free in a slot
+    :return: minimum kept between 1 and TEAM_SIZE, so only that many
+        indexes are ever cached
+    """
+    return min(max(int(minimum), 1), TEAM_SIZE)
+
+
+def get_index(minimum=TEAM_SIZE):
+    """
+    :param minimum: players on a team that need to be free in a slot, see
+        clamp_minimum
+    :return: the cached MatchmakingIndex, rebuilt if it is too old
+    """
+    minimum = clamp_minimum(minimum)
+    timeout = getattr(settings, 'MATCHMAKING_INDEX_TIMEOUT', INDEX_TIMEOUT)
+    built = _indexes.get(minimum)
+    if built is None or time.monotonic() - built[0] > timeout:
+        built = (time.monotonic(), build_index(minimum))
+        _indexes[minimum] = built
+    return built[1]
+
+
+def find_opponents(team, limit=10, minimum=TEAM_SIZE, min_shared=1):
+    """
+    Finds the best opponents for a team. The team's own availability and SR
+    are always loaded fresh; the other teams come from the cached index.
+
+    :param team: team looking for opponents
+    :param limit: most opponents to return
+    :param minimum: players on a team that need to be free in a slot, see
+        clamp_minimum
+    :param min_shared: fewest shared slots an opponent needs
+    :return: list of dicts from MatchmakingIndex.opponents
+    :raises ValueError: if none of the team's players have an SR
+    """
+    minimum = clamp_minimum(minimum)
+    quorum = team_quorum_masks([team.pk], minimum).get(team.pk)
+    if quorum is None or quorum['avg_sr'] is None:
+        raise ValueError("%s has no players with an SR." % team)
+    return get_index(minimum).opponents(team.pk, quorum['mask'],
+                                        quorum['avg_sr'], limit, min_shared)
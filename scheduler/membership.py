@@ -0,0 +1,152 @@
+"""
+Cached lookups of who is on a team and who admins it. Permission checks read
+these on almost every page, so the answers are kept in Django's cache
+framework and shared between requests. The cache used is set with the
+SCHEDULER_CACHE setting and defaults to the 'default' cache.
+
+Entries are removed by the handlers in scheduler.signals whenever
+Team.players or Team.team_admin changes, and expire after
+SCHEDULER_CACHE_TIMEOUT seconds in case a change skipped the signals
+(for example a queryset update()).
+
+The signals only clear the cache of the process that made the change. With
+a local memory cache every other worker keeps its own copy, so there the
+admin lookups expire after SCHEDULER_LOCAL_ADMIN_TIMEOUT seconds instead,
+and views that change a team or match check the admin and roster with
+fresh=True.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from scheduler.models import Team
+
+# one hour unless SCHEDULER_CACHE_TIMEOUT is set
+DEFAULT_TIMEOUT = 60 * 60
+
+# one minute unless SCHEDULER_LOCAL_ADMIN_TIMEOUT is set
+LOCAL_ADMIN_TIMEOUT = 60
+
+
+def get_cache():
+    """
+    :return: the cache membership lookups are stored in
+    """
+    return caches[getattr(settings, 'SCHEDULER_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'SCHEDULER_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def _admin_timeout():
+    timeout = _timeout()
+    if isinstance(get_cache(), LocMemCache):
+        # other processes can't clear this process's copy
+        timeout = min(timeout, getattr(settings,
+                                       'SCHEDULER_LOCAL_ADMIN_TIMEOUT',
+                                       LOCAL_ADMIN_TIMEOUT))
+    return timeout
+
+
+def members_key(team_id):
+    return 'scheduler:team:%s:members' % team_id
+
+
+def teams_key(player_pk):
+    return 'scheduler:player:%s:teams' % player_pk
+
+
+def admin_key(player_pk):
+    return 'scheduler:player:%s:admin' % player_pk
+
+
+def _cached(key, load, timeout=None):
+    cache = get_cache()
+    value = cache.get(key)
+    if value is None:
+        value = frozenset(load())
+        cache.set(key, value, _timeout() if timeout is None else timeout)
+    return value
+
+
+def team_member_ids(team_id, fresh=False):
+    """
+    :param team_id: teamID of the team
+    :param fresh: read the roster from the database instead of the cache,
+        for views that decide whether to add or remove players
+    :return: frozenset of the battlenetIDs of the players on the team
+    """
+    def load():
+        return Team.players.through.objects.filter(team_id=team_id). \
+            values_list('player_id', flat=True)
+    if fresh:
+        return frozenset(load())
+    return _cached(members_key(team_id), load)
+
+
+def player_team_ids(player):
+    """
+    :param player: player to look up, may be None
+    :return: frozenset of the teamIDs of the teams the player is on
+    """
+    if player is None:
+        return frozenset()
+    return _cached(teams_key(player.pk), lambda: Team.players.through.
+                   objects.filter(player_id=player.pk).
+                   values_list('team_id', flat=True))
+
+
+def admin_team_ids(player):
+    """
+    :param player: player to look up, may be None
+    :return: frozenset of the teamIDs of the teams the player admins
+    """
+    if player is None:
+        return frozenset()
+    return _cached(admin_key(player.pk), lambda: Team.objects.filter(
+        team_admin_id=player.pk).values_list('teamID', flat=True),
+        _admin_timeout())
+
+
+def is_team_admin(player, team_id, fresh=False):
+    """
+    :param player: player to check, may be None
+    :param team_id: teamID of the team
+    :param fresh: read the admin from the database instead of the cache,
+        for views that change or delete the team
+    :return: True if the player is the admin of the team
+    """
+    if fresh:
+        return player is not None and Team.objects.filter(
+            teamID=team_id, team_admin_id=player.pk).exists()
+    return int(team_id) in admin_team_ids(player)
+
+
+def is_team_member(player, team_id):
+    """
+    :return: True if the player is on the team
+    """
+    return int(team_id) in player_team_ids(player)
+
+
+def forget_teams(team_ids):
+    """
+    Removes the cached rosters of teams
+
+    :param team_ids: teamIDs of the teams that changed
+    """
+    get_cache().delete_many([members_key(team_id) for team_id in team_ids])
+
+
+def forget_players(player_pks, admin=False):
+    """
+    Removes the cached teams of players
+
+    :param player_pks: battlenetIDs of the players that changed
+    :param admin: also remove the teams the players admin
+    """
+    keys = [teams_key(pk) for pk in player_pks]
+    if admin:
+        keys += [admin_key(pk) for pk in player_pks]
+    get_cache().delete_many(keys)
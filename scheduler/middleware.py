@@ -0,0 +1,98 @@
+"""
+Middleware for the scheduler app. CurrentPlayerMiddleware resolves the
+logged in player and their teams once per request so views, decorators, and
+templates can share them instead of looking them up again.
+ProfilingMiddleware records how long each scheduler view takes when
+profiling is turned on.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import login
+from django.contrib.auth.forms import AuthenticationForm
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.functional import SimpleLazyObject
+
+from scheduler import profiling
+from scheduler.models import Team
+
+
+class CurrentPlayerMiddleware:
+    """
+    Adds the following to every request handled by a scheduler view:
+
+    * request.player: the logged in Player, or None
+    * request.user_teams: lazy list of the teams the player is on
+    * request.admin_teams: lazy list of the teams the player admins, with
+      their roster totals (TeamStats) loaded
+    * request.login_form: the login form shown in the navigation bar
+
+    Logging in from the navigation bar is handled here as well, so the view
+    already sees the logged in player.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not view_func.__module__.startswith('scheduler.'):
+            return None
+
+        request.login_form = None
+        if not request.user.is_authenticated:
+            request.login_form = AuthenticationForm()
+            # the navigation bar posts its login form to the current page
+            if request.method == 'POST' and 'username' in request.POST \
+                    and 'password' in request.POST:
+                request.login_form = AuthenticationForm(request,
+                                                        data=request.POST)
+                if request.login_form.is_valid():
+                    login(request, request.login_form.get_user())
+
+        if request.user.is_authenticated:
+            player = request.user
+            request.player = player
+            request.user_teams = SimpleLazyObject(
+                lambda: list(Team.objects.filter(players=player)))
+            request.admin_teams = SimpleLazyObject(
+                lambda: list(Team.objects.filter(team_admin=player).
+                             select_related('stats')))
+        else:
+            request.player = None
+            request.user_teams = None
+            request.admin_teams = None
+        return None
+
+
+class ProfilingMiddleware:
+    """
+    Records the queries, template rendering, and wall time of every request
+    to a scheduler view in scheduler.profiling.store. Only used when the
+    SCHEDULER_PROFILING setting is True. It should be first in MIDDLEWARE so
+    the wall time includes the other middleware.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SCHEDULER_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        profiling.instrument_templates()
+
+    def __call__(self, request):
+        began = time.perf_counter()
+        with profiling.profile_request(profiling.RequestProfile()) as profile:
+            response = self.get_response(request)
+        view_name = getattr(request, 'profile_view', None)
+        if view_name is not None:
+            profiling.store.record(view_name, profile,
+                                   time.perf_counter() - began)
+            profiling.store.publish()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if view_func.__module__.startswith('scheduler.'):
+            request.profile_view = request.resolver_match.view_name
+        return None
@@ -0,0 +1,106 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0002_auto_20190301_0209'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='match',
+            name='captureTeam',
+        ),
+        migrations.RemoveField(
+            model_name='match',
+            name='defenseTeam',
+        ),
+        migrations.RemoveField(
+            model_name='match',
+            name='loser',
+        ),
+        migrations.RemoveField(
+            model_name='match',
+            name='match_time',
+        ),
+        migrations.RemoveField(
+            model_name='player',
+            name='team',
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='player_set_1',
+            field=models.ManyToManyField(blank=True, related_name='player_set_1', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='player_set_2',
+            field=models.ManyToManyField(blank=True, related_name='player_set_2', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='team_1',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='team_1', to='scheduler.Team'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='team_2',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='team_2', to='scheduler.Team'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='availability_mask',
+            field=models.BinaryField(default=b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00', max_length=21),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='organization',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='players',
+            field=models.ManyToManyField(blank=True, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='match',
+            name='matchMap',
+            field=models.CharField(blank=True, choices=[('Château Guillard', 'Château Guillard'), ('Dorado', 'Dorado'), ('Eichenwalde', 'Eichenwalde'), ('Hanamura', 'Hanamura'), ('Hollywood', 'Hollywood'), ('Horizon Lunar Colony', 'Horizon Lunar Colony'), ('Ilios', 'Ilios'), ("King's Row", "King's Row"), ('Lijang Tower', 'Lijang Tower'), ('Nepal', 'Nepal'), ('Numbani', 'Numbani'), ('Oasis', 'Oasis'), ('Route 66', 'Route 66'), ('Temple of Anubis', 'Temple of Anubis'), ('Volskaya Industries', 'Volskaya Industries'), ('Watchpoint: Gibraltar', 'Watchpoint: Gibraltar')], max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name='match',
+            name='winner',
+            field=models.IntegerField(blank=True, choices=[(1, 'Team 1'), (2, 'Team 2')], null=True),
+        ),
+        migrations.AlterField(
+            model_name='player',
+            name='role',
+            field=models.CharField(blank=True, choices=[('Damage', 'Damage'), ('Tank', 'Tank'), ('Support', 'Support')], max_length=7, null=True),
+        ),
+        migrations.AlterField(
+            model_name='player',
+            name='skillRating',
+            field=models.IntegerField(blank=True, null=True, verbose_name='SR'),
+        ),
+        migrations.AlterField(
+            model_name='player',
+            name='university',
+            field=models.CharField(blank=True, choices=[('Grand Valley State University', 'Grand Valley State University')], max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='timeslot',
+            name='dayOfWeek',
+            field=models.IntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')]),
+        ),
+    ]
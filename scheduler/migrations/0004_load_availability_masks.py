@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:40
+
+from django.db import migrations
+
+
+def load_masks(apps, schema_editor):
+    Player = apps.get_model('scheduler', 'Player')
+    TimeSlot = apps.get_model('scheduler', 'TimeSlot')
+    masks = {}
+    rows = TimeSlot.players_available.through.objects.values_list(
+        'player_id', 'timeslot__dayOfWeek', 'timeslot__hour')
+    for player_id, day, hour in rows:
+        masks[player_id] = masks.get(player_id, 0) | 1 << (day * 24 + hour)
+    for player_id, mask in masks.items():
+        Player.objects.filter(pk=player_id).update(
+            availability_mask=mask.to_bytes(21, 'little'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0003_player_availability_mask'),
+    ]
+
+    operations = [
+        migrations.RunPython(load_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0004_load_availability_masks'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='match',
+            name='time',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
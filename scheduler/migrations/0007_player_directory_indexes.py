@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0006_match_last_modified'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['role', 'battlenetID'], name='scheduler_p_role_7fec1a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['university', 'battlenetID'], name='scheduler_p_univers_87fbae_idx'),
+        ),
+    ]
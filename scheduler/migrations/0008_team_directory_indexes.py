@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0007_player_directory_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='team',
+            index=models.Index(fields=['is_active', 'teamID'], name='scheduler_t_is_acti_5aec04_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='team',
+            index=models.Index(fields=['organization', 'teamID'], name='scheduler_t_organiz_41a7cf_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 2.2.28 on 2026-10-18 16:20
+
+from django.db import migrations
+
+# (table, column) searched by the autocompletes. The expressions match the
+# UPPER("column"::text) Django uses for icontains and istartswith
+SEARCHED = (
+    ('scheduler_player', 'battlenetID'),
+    ('scheduler_team', 'teamAlias'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    # other databases use the in-process index in scheduler.search
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, column in SEARCHED:
+        name = '%s_%s' % (table, column.lower())
+        # substring matches
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS %s_trgm ON %s USING gin '
+            '(UPPER("%s"::text) gin_trgm_ops)' % (name, table, column))
+        # prefix matches, including ones too short for trigrams
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS %s_prefix ON %s '
+            '(UPPER("%s"::text) text_pattern_ops)' % (name, table, column))
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column in SEARCHED:
+        name = '%s_%s' % (table, column.lower())
+        schema_editor.execute('DROP INDEX IF EXISTS %s_trgm' % name)
+        schema_editor.execute('DROP INDEX IF EXISTS %s_prefix' % name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0008_team_directory_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 2.2.28 on 2026-10-18 16:06
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+import django.db.models.deletion
+
+
+def count_teams(apps, schema_editor):
+    Team = apps.get_model('scheduler', 'Team')
+    TeamStats = apps.get_model('scheduler', 'TeamStats')
+    rows = Team.players.through.objects.values('team_id').annotate(
+        num_players=Count('player_id'),
+        sr_total=Sum('player__skillRating'),
+        sr_count=Count('player__skillRating'),
+        tank_count=Count('player_id', filter=Q(player__role='Tank')),
+        damage_count=Count('player_id', filter=Q(player__role='Damage')),
+        support_count=Count('player_id', filter=Q(player__role='Support')),
+    ).order_by()
+    totals = {}
+    for row in rows:
+        team_id = row.pop('team_id')
+        row['sr_total'] = row['sr_total'] or 0
+        totals[team_id] = row
+    TeamStats.objects.bulk_create(
+        [TeamStats(team_id=team_id, **totals.get(team_id, {}))
+         for team_id in Team.objects.values_list('pk', flat=True)],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0009_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamStats',
+            fields=[
+                ('team', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='scheduler.Team')),
+                ('num_players', models.IntegerField(default=0)),
+                ('sr_total', models.IntegerField(default=0)),
+                ('sr_count', models.IntegerField(default=0)),
+                ('tank_count', models.IntegerField(default=0)),
+                ('damage_count', models.IntegerField(default=0)),
+                ('support_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_teams, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 2.2.28 on 2026-10-18 16:44
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0010_teamstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='last_modified',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
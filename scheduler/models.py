@@ -23,11 +23,50 @@ class Team(models.Model):
     players = models.ManyToManyField('Player', blank=True)
     organization = models.CharField(max_length=50, blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    # when the team was last saved, so calendar feeds change on renames
+    last_modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # the teams directory filters by these and pages by teamID
+        indexes = [
+            models.Index(fields=['is_active', 'teamID']),
+            models.Index(fields=['organization', 'teamID']),
+        ]
 
     def __str__(self):
         return str(self.teamAlias) + "#" + str(self.teamID)
 
 
+class TeamStats(models.Model):
+    """
+    Totals for a team's roster so pages can show its size, average SR, and
+    roles without counting the roster. These are kept up to date by
+    scheduler.signals and can be rebuilt with the rebuild_team_stats command.
+    """
+    team = models.OneToOneField(Team, primary_key=True,
+                                on_delete=models.CASCADE,
+                                related_name='stats')
+    num_players = models.IntegerField(default=0)
+    # sum and number of the SRs of players that have one
+    sr_total = models.IntegerField(default=0)
+    sr_count = models.IntegerField(default=0)
+    tank_count = models.IntegerField(default=0)
+    damage_count = models.IntegerField(default=0)
+    support_count = models.IntegerField(default=0)
+
+    @property
+    def avg_sr(self):
+        """
+        :return: average SR of the players with an SR, or None
+        """
+        if not self.sr_count:
+            return None
+        return self.sr_total / self.sr_count
+
+    def __str__(self):
+        return "Stats for team " + str(self.team_id)
+
+
 class Player(AbstractUser):
     """
     This is the model for Players (users) to store in the database.
@@ -73,6 +112,18 @@ class Player(AbstractUser):
 
     skillRating = models.IntegerField("SR", null=True, blank=True)
 
+    # compact copy of the player's weekly availability. Bit (day * 24 + hour)
+    # is set when the player is free during that TimeSlot. This is kept in
+    # sync with TimeSlot.players_available by scheduler.signals
+    availability_mask = models.BinaryField(max_length=21, default=bytes(21))
+
+    class Meta(AbstractUser.Meta):
+        # the players directory filters by these and pages by battletag
+        indexes = [
+            models.Index(fields=['role', 'battlenetID']),
+            models.Index(fields=['university', 'battlenetID']),
+        ]
+
     def __str__(self):
         """
         overriding the default string for a player to their battletag
@@ -157,8 +208,8 @@ class Match(models.Model):
     matchMap = models.CharField(max_length=50, choices=MAP_CHOICES,
                                 blank=True, null=True)
 
-    # time match is scheduled
-    time = models.DateTimeField(default=timezone.now)
+    # time match is scheduled. Indexed for calendar date ranges
+    time = models.DateTimeField(default=timezone.now, db_index=True)
 
     # first team
     # players is distinguished from teams
@@ -185,3 +236,6 @@ class Match(models.Model):
         (TEAM_2, 'Team 2'),
     )
     winner = models.IntegerField(choices=TEAMS, blank=True, null=True)
+
+    # when the match was last saved, used for calendar feed caching
+    last_modified = models.DateTimeField(auto_now=True)
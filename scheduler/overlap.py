@@ -0,0 +1,209 @@
+"""
+Finds the times a group of players are free together. Availability for a
+whole roster is loaded in one query as bit masks (see scheduler.availability)
+and combined in memory instead of joining TimeSlot once per player.
+"""
+from scheduler.availability import SLOTS_PER_WEEK, FULL_WEEK, \
+    HOURS_PER_DAY, mask_from_bytes, slots_in_mask
+from scheduler.models import Player, Team, TimeSlot
+
+# an overwatch team plays six players, two of each role
+TEAM_SIZE = 6
+ROLE_SLOTS = {
+    Player.TANK: 2,
+    Player.DAMAGE: 2,
+    Player.SUPPORT: 2,
+}
+
+
+def roster_masks(players):
+    """
+    Loads the availability of every player in a queryset with one query
+
+    :param players: queryset of players, such as team.players.all()
+    :return: dict of battlenetID to availability mask
+    """
+    return {pk: mask_from_bytes(value) for pk, value in
+            players.values_list('battlenetID', 'availability_mask')}
+
+
+def roster_roles(players):
+    """
+    Loads the role and availability of every player in a queryset with one
+    query, for pages that need both the common slots and quorum_slots
+
+    :param players: queryset of players, such as team.players.all()
+    :return: dict of battlenetID to a (role, availability mask) tuple
+    """
+    return {pk: (role, mask_from_bytes(value)) for pk, role, value in
+            players.values_list('battlenetID', 'role', 'availability_mask')}
+
+
+def common_mask(masks):
+    """
+    :param masks: iterable of availability masks
+    :return: mask of the slots every player is free, 0 if there are no masks
+    """
+    common = FULL_WEEK
+    empty = True
+    for mask in masks:
+        common &= mask
+        empty = False
+    return 0 if empty else common
+
+
+def slot_counts(masks):
+    """
+    :param masks: iterable of availability masks
+    :return: list with the number of players free in each of the 168 slots
+    """
+    counts = [0] * SLOTS_PER_WEEK
+    for mask in masks:
+        for index in slots_in_mask(mask):
+            counts[index] += 1
+    return counts
+
+
+def at_least_mask(counts, minimum):
+    """
+    :param counts: per slot counts from slot_counts
+    :param minimum: number of players that need to be free
+    :return: mask of the slots with at least minimum players free
+    """
+    mask = 0
+    for index, count in enumerate(counts):
+        if count >= minimum:
+            mask |= 1 << index
+    return mask
+
+
+def ranked_slots(counts, minimum=1):
+    """
+    :param counts: per slot counts from slot_counts
+    :param minimum: slots with fewer players free are left out
+    :return: list of (slot index, count) with the most players free first,
+        ties are kept in week order
+    """
+    ranked = [(index, count) for index, count in enumerate(counts)
+              if count >= max(minimum, 1)]
+    ranked.sort(key=lambda slot: -slot[1])
+    return ranked
+
+
+def overlap(masks, minimum=None):
+    """
+    Combines a group's availability in one pass
+
+    :param masks: iterable of availability masks
+    :param minimum: number of players that need to be free for a slot to be
+        ranked, defaults to everyone
+    :return: dict with the slots everyone is free ('common'), the per slot
+        counts ('counts'), the slots with at least minimum players free
+        ('at_least') and those slots ranked by count ('ranked')
+    """
+    masks = list(masks)
+    counts = slot_counts(masks)
+    if minimum is None:
+        minimum = len(masks)
+    return {
+        'common': common_mask(masks),
+        'counts': counts,
+        'at_least': at_least_mask(counts, max(minimum, 1)),
+        'ranked': ranked_slots(counts, minimum),
+    }
+
+
+def team_quorum_masks(team_ids, minimum=TEAM_SIZE):
+    """
+    Finds when each team has enough players free to play. Every roster is
+    loaded with one query no matter how many teams there are.
+
+    :param team_ids: teamIDs of the teams to check
+    :param minimum: number of players on a team that need to be free
+    :return: dict of teamID to a dict with the mask of slots with at least
+        minimum players free ('mask') and the roster's average SR ('avg_sr')
+    """
+    counts = {}
+    ratings = {}
+    rows = Team.players.through.objects.filter(team_id__in=team_ids). \
+        values_list('team_id', 'player__skillRating',
+                    'player__availability_mask')
+    for team_id, rating, value in rows:
+        if team_id not in counts:
+            counts[team_id] = [0] * SLOTS_PER_WEEK
+            ratings[team_id] = []
+        for index in slots_in_mask(mask_from_bytes(value)):
+            counts[team_id][index] += 1
+        if rating is not None:
+            ratings[team_id].append(rating)
+    return {team_id: {
+        'mask': at_least_mask(counts[team_id], max(minimum, 1)),
+        'avg_sr': sum(ratings[team_id]) / len(ratings[team_id])
+        if ratings[team_id] else None,
+    } for team_id in counts}
+
+
+def quorum_slots(players, minimum=TEAM_SIZE, roles=None):
+    """
+    Ranks the times where at least minimum players are free. Slots that can
+    fill more of the role requirements come first, then slots with more
+    players free. Availability and roles are loaded with one query and
+    counted per slot in memory.
+
+    :param players: queryset of players, such as team.players.all()
+    :param minimum: number of players that need to be free
+    :param roles: dict of role to the number of players needed in that role,
+        defaults to ROLE_SLOTS
+    :return: list of dicts from rank_quorum
+    """
+    return rank_quorum(
+        [(role, mask_from_bytes(value)) for role, value in
+         players.values_list('role', 'availability_mask')], minimum, roles)
+
+
+def rank_quorum(players, minimum=TEAM_SIZE, roles=None):
+    """
+    Ranks the times where at least minimum players are free from roles and
+    masks that are already loaded, see quorum_slots
+
+    :param players: iterable of (role, availability mask) tuples, such as
+        the values of roster_roles
+    :param minimum: number of players that need to be free
+    :param roles: dict of role to the number of players needed in that role,
+        defaults to ROLE_SLOTS
+    :return: list of dicts with the slot index, day, day_name, hour, count
+        of players free, free players per role ('roles'), how many role
+        spots can be filled ('covered') and whether every role can be
+        filled ('full_roles')
+    """
+    if roles is None:
+        roles = ROLE_SLOTS
+    counts = [0] * SLOTS_PER_WEEK
+    role_counts = {role: [0] * SLOTS_PER_WEEK for role in roles}
+    for role, mask in players:
+        for index in slots_in_mask(mask):
+            counts[index] += 1
+            if role in role_counts:
+                role_counts[role][index] += 1
+
+    needed = sum(roles.values())
+    day_names = dict(TimeSlot.DAYS_OF_WEEK)
+    ranked = []
+    for index, count in enumerate(counts):
+        if count < max(minimum, 1):
+            continue
+        by_role = {role: role_counts[role][index] for role in roles}
+        covered = sum(min(by_role[role], need)
+                      for role, need in roles.items())
+        ranked.append({
+            'slot': index,
+            'day': index // HOURS_PER_DAY,
+            'day_name': day_names[index // HOURS_PER_DAY],
+            'hour': index % HOURS_PER_DAY,
+            'count': count,
+            'roles': by_role,
+            'covered': covered,
+            'full_roles': covered == needed,
+        })
+    ranked.sort(key=lambda slot: (-slot['covered'], -slot['count']))
+    return ranked
@@ -0,0 +1,109 @@
+"""
+Caching of the public pages. Most visitors to the home, players, teams, and
+player profile pages aren't logged in and see the same page, so those
+responses are cached whole (see decorators.cache_for_anonymous). The players
+and teams directory tables are also cached as template fragments for
+everyone.
+
+Every cache key includes a version number that the handlers in
+scheduler.signals increase whenever a player, team, roster, or availability
+changes, so old pages are never shown after an edit. The cache used is set
+with SCHEDULER_PAGE_CACHE and entries are kept for
+SCHEDULER_PAGE_CACHE_TIMEOUT seconds.
+"""
+import hashlib
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+# five minutes unless SCHEDULER_PAGE_CACHE_TIMEOUT is set
+DEFAULT_TIMEOUT = 5 * 60
+
+VERSION_KEY = 'scheduler:pages:version'
+
+# the hidden input rendered by {% csrf_token %}
+_CSRF_INPUT = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def get_cache():
+    """
+    :return: the cache pages are stored in
+    """
+    return caches[getattr(settings, 'SCHEDULER_PAGE_CACHE', 'default')]
+
+
+def page_timeout():
+    """
+    :return: seconds pages and fragments are kept for
+    """
+    return getattr(settings, 'SCHEDULER_PAGE_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def version():
+    """
+    :return: the current version of the cached pages
+    """
+    cache = get_cache()
+    current = cache.get(VERSION_KEY)
+    if current is None:
+        # start after any version that might have been evicted
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        current = cache.get(VERSION_KEY)
+    return current
+
+
+def forget_pages():
+    """
+    Makes every cached page and fragment stale after a player or team
+    changed
+    """
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        version()
+
+
+def page_key(request):
+    """
+    :param request: GET request for a public page
+    :return: cache key of the page at the current version
+    """
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return 'scheduler:page:%s:%s' % (version(), path)
+
+
+def cached_response(request, key):
+    """
+    :param request: request the page is for
+    :param key: key from page_key
+    :return: the cached page with a new CSRF token, or None
+    """
+    cached = get_cache().get(key)
+    if cached is None:
+        return None
+    content, content_type = cached
+    if _CSRF_INPUT.search(content):
+        # cached pages can't reuse the token of whoever they were made for
+        token = get_token(request).encode()
+        content = _CSRF_INPUT.sub(lambda match: match.group(1) + token +
+                                  match.group(2), content)
+    return HttpResponse(content, content_type=content_type)
+
+
+def save_response(key, response):
+    """
+    Caches a page if it can be shown to every anonymous visitor
+
+    :param key: key from page_key
+    :param response: response of the view
+    """
+    if response.status_code != 200 or response.streaming or \
+            response.cookies:
+        return
+    get_cache().set(key, (response.content, response['Content-Type']),
+                    page_timeout())
@@ -0,0 +1,354 @@
+"""
+Opt-in profiling of the scheduler views. When the SCHEDULER_PROFILING
+setting is True, ProfilingMiddleware (see scheduler.middleware) records the
+following for every request to a scheduler view, grouped by URL name:
+
+* the number of SQL queries and the time spent running them
+* the time spent rendering templates, including queries run while rendering
+* the wall time of the whole request
+* queries run many times with the same shape (the SQL without its
+  parameters), which usually means a queryset is being looked up once per
+  row instead of with select_related, prefetch_related, or __in
+
+Only the last SCHEDULER_PROFILING_WINDOW requests of each view are kept, so
+the numbers follow recent traffic. Each process also saves its totals to the
+SCHEDULER_CACHE every few seconds so the profile_stats view and the
+profile_report command can combine every process when the cache is shared.
+"""
+import os
+import re
+import socket
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+
+from scheduler.membership import get_cache
+
+# defaults for SCHEDULER_PROFILING_WINDOW and SCHEDULER_PROFILING_REPEATS
+WINDOW = 1000
+REPEATS = 5
+
+# upper edges in milliseconds of the wall time histogram buckets, slower
+# requests go in one last bucket
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# repeated shapes kept for each view
+SHAPES_KEPT = 5
+
+# seconds between saving this process's totals to the cache
+PUBLISH_INTERVAL = 10
+
+# cache key listing the keys every process saves its totals under
+PROCESSES_KEY = 'scheduler:profile:processes'
+
+# what each column of a report is sorted by
+SORTS = {
+    'wall': 'wall_ms',
+    'queries': 'queries',
+    'db': 'db_ms',
+    'template': 'template_ms',
+    'n_plus_one': 'n_plus_one',
+}
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_SPACE = re.compile(r'\s+')
+
+_local = threading.local()
+_template_render = None
+
+
+def sql_shape(sql):
+    """
+    :param sql: SQL sent to the database
+    :return: the SQL with its parameters, literals, and IN lists of any
+        length replaced, so the same lookup for different rows matches
+    """
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _LITERAL.sub('?', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class RequestProfile:
+    """
+    Counts the queries and template rendering of one request. It is
+    installed as an execute wrapper on every database connection by
+    profile_request.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.shapes = Counter()
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        began = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - began
+            self.queries += 1
+            self.shapes[sql_shape(sql)] += 1
+
+    def repeated(self, repeats=REPEATS):
+        """
+        :param repeats: times a shape has to run to be counted
+        :return: dict of each query shape run at least repeats times to the
+            number of times it ran
+        """
+        return {shape: count for shape, count in self.shapes.items()
+                if count >= repeats}
+
+
+def _timed_render(self, context):
+    profile = getattr(_local, 'profile', None)
+    # included templates are timed as part of the template including them
+    if profile is None or profile.rendering:
+        return _template_render(self, context)
+    profile.rendering = True
+    began = time.perf_counter()
+    try:
+        return _template_render(self, context)
+    finally:
+        profile.template_time += time.perf_counter() - began
+        profile.rendering = False
+
+
+def instrument_templates():
+    """
+    Times Template.render for the request being profiled. This is only done
+    once and only when profiling is turned on.
+    """
+    global _template_render
+    if _template_render is None:
+        _template_render = Template.render
+        Template.render = _timed_render
+
+
+@contextmanager
+def profile_request(profile):
+    """
+    Records the queries and template rendering of the current thread in
+    profile until the block ends
+
+    :param profile: RequestProfile to record into
+    """
+    _local.profile = profile
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            yield profile
+    finally:
+        _local.profile = None
+
+
+def _empty_totals():
+    return {
+        'requests': 0,
+        'queries': 0,
+        'db_ms': 0.0,
+        'template_ms': 0.0,
+        'wall_ms': 0.0,
+        'max_queries': 0,
+        'max_wall_ms': 0.0,
+        'n_plus_one': 0,
+        'histogram': [0] * (len(BUCKETS) + 1),
+        'repeated': {},
+    }
+
+
+def _bucket(wall_ms):
+    for position, edge in enumerate(BUCKETS):
+        if wall_ms <= edge:
+            return position
+    return len(BUCKETS)
+
+
+def _keep_worst(repeated):
+    return dict(sorted(repeated.items(), key=lambda item: -item[1])
+                [:SHAPES_KEPT])
+
+
+class ProfileStore:
+    """
+    The most recent requests of each view. Totals are worked out from the
+    requests kept whenever they are asked for, so old requests drop out as
+    new ones come in.
+    """
+
+    def __init__(self, window=WINDOW, repeats=REPEATS):
+        self.window = window
+        self.repeats = repeats
+        self.requests = defaultdict(lambda: deque(maxlen=self.window))
+        self.lock = threading.Lock()
+        self.published = 0.0
+
+    def record(self, view_name, profile, wall_time):
+        """
+        :param view_name: URL name of the view, such as 'scheduler:home'
+        :param profile: RequestProfile of the request
+        :param wall_time: seconds the request took
+        """
+        sample = (wall_time * 1000, profile.queries, profile.db_time * 1000,
+                  profile.template_time * 1000,
+                  profile.repeated(self.repeats))
+        with self.lock:
+            self.requests[view_name].append(sample)
+
+    def totals(self):
+        """
+        :return: dict of URL name to totals that can be combined with other
+            processes' by merge
+        """
+        with self.lock:
+            requests = {name: list(samples)
+                        for name, samples in self.requests.items()}
+        totals = {}
+        for name, samples in requests.items():
+            view = totals[name] = _empty_totals()
+            for wall_ms, queries, db_ms, template_ms, repeated in samples:
+                view['requests'] += 1
+                view['queries'] += queries
+                view['db_ms'] += db_ms
+                view['template_ms'] += template_ms
+                view['wall_ms'] += wall_ms
+                view['max_queries'] = max(view['max_queries'], queries)
+                view['max_wall_ms'] = max(view['max_wall_ms'], wall_ms)
+                view['histogram'][_bucket(wall_ms)] += 1
+                if repeated:
+                    view['n_plus_one'] += 1
+                for shape, count in repeated.items():
+                    view['repeated'][shape] = max(
+                        view['repeated'].get(shape, 0), count)
+            view['repeated'] = _keep_worst(view['repeated'])
+        return totals
+
+    def clear(self):
+        """ forgets every request recorded """
+        with self.lock:
+            self.requests.clear()
+            self.published = 0.0
+
+    def publish(self, force=False):
+        """
+        Saves this process's totals to the cache if they haven't been saved
+        in the last PUBLISH_INTERVAL seconds
+
+        :param force: save even if they were saved recently
+        """
+        if not force and time.monotonic() - self.published < \
+                PUBLISH_INTERVAL:
+            return
+        self.published = time.monotonic()
+        cache = get_cache()
+        key = process_key()
+        processes = cache.get(PROCESSES_KEY) or []
+        if key not in processes:
+            cache.set(PROCESSES_KEY, processes + [key], None)
+        cache.set(key, self.totals(), None)
+
+
+store = ProfileStore(
+    getattr(settings, 'SCHEDULER_PROFILING_WINDOW', WINDOW),
+    getattr(settings, 'SCHEDULER_PROFILING_REPEATS', REPEATS))
+
+
+def process_key():
+    """
+    :return: cache key this process saves its totals under
+    """
+    return 'scheduler:profile:%s:%d' % (socket.gethostname(), os.getpid())
+
+
+def published():
+    """
+    :return: list of the totals saved by every process
+    """
+    cache = get_cache()
+    keys = cache.get(PROCESSES_KEY) or []
+    return list(cache.get_many(keys).values())
+
+
+def forget_published():
+    """ removes every process's saved totals from the cache """
+    cache = get_cache()
+    cache.delete_many((cache.get(PROCESSES_KEY) or []) + [PROCESSES_KEY])
+
+
+def merge(all_totals):
+    """
+    :param all_totals: iterable of dicts from ProfileStore.totals
+    :return: one dict of URL name to the combined totals
+    """
+    merged = {}
+    for totals in all_totals:
+        for name, view in totals.items():
+            into = merged.setdefault(name, _empty_totals())
+            for field in ('requests', 'queries', 'db_ms', 'template_ms',
+                          'wall_ms', 'n_plus_one'):
+                into[field] += view[field]
+            for field in ('max_queries', 'max_wall_ms'):
+                into[field] = max(into[field], view[field])
+            into['histogram'] = [mine + theirs for mine, theirs in
+                                 zip(into['histogram'], view['histogram'])]
+            for shape, count in view['repeated'].items():
+                into['repeated'][shape] = max(
+                    into['repeated'].get(shape, 0), count)
+    for view in merged.values():
+        view['repeated'] = _keep_worst(view['repeated'])
+    return merged
+
+
+def percentile(view, fraction):
+    """
+    Estimates a percentile of the wall time from the histogram
+
+    :param view: totals of one view
+    :param fraction: percentile wanted between 0 and 1, such as 0.95
+    :return: upper edge in milliseconds of the bucket the percentile is in
+    """
+    needed = fraction * view['requests']
+    seen = 0
+    for edge, count in zip(BUCKETS, view['histogram']):
+        seen += count
+        if seen >= needed:
+            return edge
+    return view['max_wall_ms']
+
+
+def top_offenders(totals, sort='wall', limit=10):
+    """
+    :param totals: dict from ProfileStore.totals or merge
+    :param sort: one of SORTS, views are ranked by the total of that column
+        over every request kept
+    :param limit: most views to return
+    :return: list of dicts with the averages, p95 wall time, and worst
+        repeated queries of the views, worst first
+    """
+    field = SORTS[sort]
+    rows = []
+    for name, view in sorted(totals.items(),
+                             key=lambda item: -item[1][field])[:limit]:
+        requests = view['requests'] or 1
+        rows.append({
+            'view': name,
+            'requests': view['requests'],
+            'avg_queries': view['queries'] / requests,
+            'max_queries': view['max_queries'],
+            'avg_db_ms': view['db_ms'] / requests,
+            'avg_template_ms': view['template_ms'] / requests,
+            'avg_wall_ms': view['wall_ms'] / requests,
+            'p95_wall_ms': percentile(view, 0.95),
+            'max_wall_ms': view['max_wall_ms'],
+            'n_plus_one': view['n_plus_one'],
+            'repeated': view['repeated'],
+        })
+    return rows
@@ -1,12 +1,303 @@
+"""
+Batch scheduling for matches between teams. Availability for every team is
+loaded up front (see scheduler.overlap.team_quorum_masks) so the number of
+queries does not depend on the number of teams.
+"""
+import time
+from datetime import timedelta
 
-from .models import Player, TimeSlot, Match, Team
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 
+from scheduler.availability import SLOTS_PER_WEEK, next_slot_time, \
+    slots_in_mask
+from scheduler.models import Team, Match
+from scheduler.overlap import TEAM_SIZE, team_quorum_masks
 
-def no_restriction_schedule(schedule):
-    list = TimeSlot.objects.all()  # filter by each time slot in each day
-    # consecutively, and get the player names
 
-    # each item in list is a list of players
-    for item in list:
-        if len(item.players_available) > 12:
-            print("" + item.dayOfWeek + ":" + item.hour)
+def pair_teams(quorums):
+    """
+    Pairs teams that have enough players free at the same time. Each team is
+    paired at most once. Slots with the fewest teams free are filled first so
+    teams with little availability are not left out, and teams in a slot are
+    paired with the team closest to their average SR.
+
+    :param quorums: dict from overlap.team_quorum_masks
+    :return: list of (slot index, teamID, teamID)
+    """
+    slots = [[] for _ in range(SLOTS_PER_WEEK)]
+    for team_id, quorum in quorums.items():
+        mask = quorum['mask']
+        index = 0
+        while mask:
+            if mask & 1:
+                slots[index].append(team_id)
+            mask >>= 1
+            index += 1
+
+    pairs = []
+    paired = set()
+    order = sorted((index for index in range(SLOTS_PER_WEEK)
+                    if len(slots[index]) > 1),
+                   key=lambda index: len(slots[index]))
+    for index in order:
+        free = sorted((team_id for team_id in slots[index]
+                       if team_id not in paired),
+                      key=lambda team_id: quorums[team_id]['avg_sr'] or 0)
+        for first, second in zip(free[::2], free[1::2]):
+            pairs.append((index, first, second))
+            paired.update((first, second))
+    return pairs
+
+
+def no_restriction_schedule(teams=None, start=None, minimum=TEAM_SIZE,
+                            commit=True):
+    """
+    Proposes a match for as many teams as possible at a time both rosters
+    have at least minimum players free. Teams that already have a match in
+    that week are skipped, so running this every night doesn't stack up
+    matches. Uses one query to find those teams, one to load availability
+    and one to save the matches.
+
+    :param teams: queryset of teams to schedule, defaults to active teams
+    :param start: matches are scheduled in the week after this datetime,
+        defaults to now
+    :param minimum: players on each team that need to be free
+    :param commit: save the matches when True
+    :return: dict with the proposed matches ('matches'), teamIDs that could
+        not be paired ('unmatched'), teamIDs skipped because they already
+        play that week ('booked') and the time taken in seconds ('seconds')
+    """
+    began = time.perf_counter()
+    if teams is None:
+        teams = Team.objects.filter(is_active=True)
+    if start is None:
+        start = timezone.now()
+
+    team_ids = list(teams.values_list('teamID', flat=True))
+    booked = set()
+    for pair in Match.objects.filter(
+            Q(team_1__in=team_ids) | Q(team_2__in=team_ids),
+            time__gte=start, time__lt=start + timedelta(days=7)). \
+            values_list('team_1_id', 'team_2_id'):
+        booked.update(pair)
+    booked = [team_id for team_id in team_ids if team_id in booked]
+    team_ids = [team_id for team_id in team_ids if team_id not in booked]
+    quorums = team_quorum_masks(team_ids, minimum)
+    pairs = pair_teams(quorums)
+
+    matches = [Match(time=next_slot_time(index, start),
+                     team_1_id=first, team_2_id=second)
+               for index, first, second in pairs]
+    if commit and matches:
+        with transaction.atomic():
+            matches = Match.objects.bulk_create(matches)
+
+    paired = {team_id for _, first, second in pairs
+              for team_id in (first, second)}
+    return {
+        'matches': matches,
+        'unmatched': [team_id for team_id in team_ids
+                      if team_id not in paired],
+        'booked': booked,
+        'seconds': time.perf_counter() - began,
+    }
+
+
+def round_robin(team_ids):
+    """
+    Creates round robin rounds with the circle method. Every team plays every
+    other team once. With an odd number of teams one team sits out each round.
+
+    :param team_ids: teamIDs in the league
+    :return: list of rounds, each a list of (teamID, teamID)
+    """
+    teams = list(team_ids)
+    if len(teams) % 2:
+        teams.append(None)
+    rounds = []
+    for _ in range(len(teams) - 1):
+        half = len(teams) // 2
+        rounds.append([(first, second) for first, second in
+                       zip(teams[:half], reversed(teams[half:]))
+                       if first is not None and second is not None])
+        # keep the first team in place and rotate the rest
+        teams.insert(1, teams.pop())
+    return rounds
+
+
+def swiss_round(team_ids, wins, played, quorums):
+    """
+    Pairs teams with the closest record that have not played each other yet.
+    Teams with the same record are ordered by average SR.
+
+    :param team_ids: teamIDs in the league
+    :param wins: dict of teamID to number of wins
+    :param played: set of frozenset pairs of teamIDs that already played
+    :param quorums: dict from overlap.team_quorum_masks
+    :return: list of (teamID, teamID)
+    """
+    order = sorted(team_ids, key=lambda team_id: (
+        -wins.get(team_id, 0),
+        -((quorums.get(team_id) or {}).get('avg_sr') or 0)))
+    pairs = []
+    while len(order) > 1:
+        first = order.pop(0)
+        # fall back to a rematch if every remaining team was already played
+        for position, second in enumerate(order):
+            if frozenset((first, second)) not in played:
+                break
+        else:
+            position = 0
+        pairs.append((first, order.pop(position)))
+    return pairs
+
+
+def _slot_distance(first, second):
+    """ hours between two weekly slots going either way around the week """
+    distance = abs(first - second)
+    return min(distance, SLOTS_PER_WEEK - distance)
+
+
+def assign_slots(pairs, quorums, last_slots, per_slot=None):
+    """
+    Picks a weekly slot for every pair in a round where both teams have
+    enough players free. Pairs with the fewest shared slots are placed first,
+    and each pair prefers the slot closest to when its teams last played so
+    matches stay evenly spaced. When every shared slot is full another pair
+    is moved to one of its other slots to make room.
+
+    :param pairs: list of (teamID, teamID) for the round
+    :param quorums: dict from overlap.team_quorum_masks
+    :param last_slots: dict of teamID to the slot of its previous match
+    :param per_slot: most matches that can be played in one slot, or None
+    :return: dict of pair to slot index, pairs without a slot are left out
+    """
+    def common(pair):
+        return slots_in_mask(
+            (quorums.get(pair[0]) or {}).get('mask', 0) &
+            (quorums.get(pair[1]) or {}).get('mask', 0))
+
+    def has_room(index):
+        return per_slot is None or len(used[index]) < per_slot
+
+    def score(pair, index):
+        return sum(_slot_distance(index, last_slots[team_id])
+                   for team_id in pair if team_id in last_slots), \
+            len(used[index])
+
+    shared = {pair: common(pair) for pair in pairs}
+    used = [[] for _ in range(SLOTS_PER_WEEK)]
+    assigned = {}
+    for pair in sorted(pairs, key=lambda pair: len(shared[pair])):
+        open_slots = [index for index in shared[pair] if has_room(index)]
+        if open_slots:
+            index = min(open_slots, key=lambda index: score(pair, index))
+            used[index].append(pair)
+            assigned[pair] = index
+            continue
+        # local search: move a pair out of one of the full slots
+        moved = False
+        for index in shared[pair]:
+            for other in used[index]:
+                free = [spare for spare in shared[other]
+                        if spare != index and has_room(spare)]
+                if free:
+                    spare = min(free, key=lambda spare: score(other, spare))
+                    used[index].remove(other)
+                    used[spare].append(other)
+                    assigned[other] = spare
+                    used[index].append(pair)
+                    assigned[pair] = index
+                    moved = True
+                    break
+            if moved:
+                break
+    return assigned
+
+
+def league_schedule(teams, weeks, start=None, style='round-robin',
+                    minimum=TEAM_SIZE, per_slot=None, commit=True):
+    """
+    Schedules a league over a number of weeks with one round per week, so
+    every team plays at most once a week. Availability and past results are
+    loaded once for the whole league and the matches are saved together.
+
+    :param teams: queryset of teams in the league
+    :param weeks: number of weeks to schedule
+    :param start: first week starts after this datetime, defaults to now
+    :param style: 'round-robin' or 'swiss'
+    :param minimum: players on each team that need to be free
+    :param per_slot: most matches that can be played in one slot, or None
+    :param commit: save the matches when True
+    :return: dict with the proposed matches ('matches'), the (week, teamID,
+        teamID) pairings that couldn't be scheduled ('unscheduled'), those of
+        them that had time in common but every shared slot was full
+        ('crowded') and the time taken in seconds ('seconds')
+    """
+    began = time.perf_counter()
+    if start is None:
+        start = timezone.now()
+    if style not in ('round-robin', 'swiss'):
+        raise ValueError("Unknown league style: %s" % style)
+
+    team_ids = list(teams.order_by('teamID').values_list('teamID',
+                                                         flat=True))
+    quorums = team_quorum_masks(team_ids, minimum)
+
+    wins = {}
+    played = set()
+    if style == 'swiss':
+        results = Match.objects.filter(
+            Q(team_1__in=team_ids) | Q(team_2__in=team_ids)).values_list(
+                'team_1_id', 'team_2_id', 'winner')
+        for team_1, team_2, winner in results:
+            played.add(frozenset((team_1, team_2)))
+            if winner == Match.TEAM_1:
+                wins[team_1] = wins.get(team_1, 0) + 1
+            elif winner == Match.TEAM_2:
+                wins[team_2] = wins.get(team_2, 0) + 1
+    else:
+        rounds = round_robin(team_ids)
+
+    matches = []
+    unscheduled = []
+    crowded = []
+    last_slots = {}
+    for week in range(weeks):
+        if style == 'swiss':
+            pairs = swiss_round(team_ids, wins, played, quorums)
+            played.update(frozenset(pair) for pair in pairs)
+        elif rounds:
+            pairs = rounds[week % len(rounds)]
+            # swap sides on each repeat of the round robin
+            if (week // len(rounds)) % 2:
+                pairs = [(second, first) for first, second in pairs]
+        else:
+            pairs = []
+
+        assigned = assign_slots(pairs, quorums, last_slots, per_slot)
+        week_start = start + timedelta(days=7 * week)
+        for pair in pairs:
+            if pair not in assigned:
+                unscheduled.append((week, pair[0], pair[1]))
+                if (quorums.get(pair[0]) or {}).get('mask', 0) & \
+                        (quorums.get(pair[1]) or {}).get('mask', 0):
+                    crowded.append((week, pair[0], pair[1]))
+                continue
+            index = assigned[pair]
+            last_slots[pair[0]] = last_slots[pair[1]] = index
+            matches.append(Match(time=next_slot_time(index, week_start),
+                                 team_1_id=pair[0], team_2_id=pair[1]))
+
+    if commit and matches:
+        with transaction.atomic():
+            matches = Match.objects.bulk_create(matches)
+
+    return {
+        'matches': matches,
+        'unscheduled': unscheduled,
+        'crowded': crowded,
+        'seconds': time.perf_counter() - began,
+    }
@@ -0,0 +1,331 @@
+"""
+Search for the player and team autocompletes. Matches that start with the
+search come first, then names that contain it anywhere, and only the first
+few are returned.
+
+On PostgreSQL the lookups use the trigram and prefix indexes added by the
+search_indexes migration. Other databases (SQLite in development and tests)
+use an in-process index of every active name and the suffixes of each name.
+Both lists are kept sorted, so prefix and substring matches are found with a
+binary search like walking a trie. That index is built on the first search
+and kept up to date by the handlers in scheduler.signals.
+
+The ranked results of recent searches are cached in process (see
+ResultCache), and hit/miss counts are shown by the autocomplete_stats view.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+
+from scheduler.models import Player, Team
+
+# most results sent back for one search
+AUTOCOMPLETE_LIMIT = 10
+
+# defaults for AUTOCOMPLETE_CACHE_SIZE and AUTOCOMPLETE_CACHE_TIMEOUT
+CACHE_SIZE = 1024
+CACHE_TIMEOUT = 60
+
+# field searched for each model
+SEARCH_FIELDS = {
+    Player: 'battlenetID',
+    Team: 'teamAlias',
+}
+
+# model -> PrefixIndex, only used when the database isn't PostgreSQL
+_indexes = {}
+
+
+class PrefixIndex:
+    """
+    Sorted lists of lowercase names and their suffixes. A substring of a name
+    is a prefix of one of its suffixes, so both kinds of match are a range
+    of one of the lists.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.suffixes = []
+        self.texts = {}
+
+    @classmethod
+    def build(cls, rows):
+        """
+        Builds an index in one sort instead of adding names one at a time
+
+        :param rows: iterable of (key, name)
+        :return: PrefixIndex of the rows
+        """
+        index = cls()
+        for key, text in rows:
+            if not text:
+                continue
+            text = text.lower()
+            index.texts[key] = text
+            index.names.append((text, key))
+            index.suffixes.extend((text[start:], key)
+                                  for start in range(1, len(text)))
+        index.names.sort()
+        index.suffixes.sort()
+        return index
+
+    def add(self, key, text):
+        """
+        :param key: primary key of the row
+        :param text: name to search for the row by
+        """
+        self.remove(key)
+        text = text.lower()
+        self.texts[key] = text
+        insort(self.names, (text, key))
+        for start in range(1, len(text)):
+            insort(self.suffixes, (text[start:], key))
+
+    def remove(self, key):
+        """
+        :param key: primary key of the row to stop searching for
+        """
+        text = self.texts.pop(key, None)
+        if text is None:
+            return
+        self._discard(self.names, (text, key))
+        for start in range(1, len(text)):
+            self._discard(self.suffixes, (text[start:], key))
+
+    @staticmethod
+    def _discard(entries, entry):
+        index = bisect_left(entries, entry)
+        if index < len(entries) and entries[index] == entry:
+            del entries[index]
+
+    @staticmethod
+    def _starting_with(entries, query):
+        index = bisect_left(entries, (query,))
+        while index < len(entries) and entries[index][0].startswith(query):
+            yield entries[index][1]
+            index += 1
+
+    def search(self, query, limit=AUTOCOMPLETE_LIMIT):
+        """
+        :param query: text to search for
+        :param limit: most keys to return
+        :return: list of keys with names starting with the query in name
+            order, followed by keys with names containing it
+        """
+        query = query.lower()
+        keys = []
+        for matches in (self._starting_with(self.names, query),
+                        self._starting_with(self.suffixes, query)):
+            for key in matches:
+                if len(keys) >= limit:
+                    return keys
+                if key not in keys:
+                    keys.append(key)
+        return keys
+
+
+class ResultCache:
+    """
+    Least recently used cache of search results that also expire after a
+    timeout. Select2 sends a search for every keystroke and many people type
+    the same names, so the ranked keys for each (model, search, limit) are
+    kept here. Entries are dropped by forget when a player or team changes.
+    Counts of hits, misses, evictions, and invalidations are kept to help
+    pick a size.
+    """
+
+    def __init__(self, size=CACHE_SIZE, timeout=CACHE_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, key):
+        """
+        :param key: key from cache_key
+        :return: cached list of keys, or None
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, keys):
+        """
+        :param key: key from cache_key
+        :param keys: ranked keys found for the search
+        """
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, keys)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def forget(self, model, name, pk):
+        """
+        Drops the searches a changed row could appear in or disappear from:
+        any search that is part of its name, and any search it was a result
+        of.
+
+        :param model: Player or Team
+        :param name: the row's current name
+        :param pk: the row's primary key
+        """
+        name = normalize(name or '')
+        with self.lock:
+            stale = [key for key, (expires, keys) in self.entries.items()
+                     if key[0] == model and (key[1] in name or pk in keys)]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        """ empties the cache and resets the counters """
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = \
+                self.invalidations = 0
+
+    def stats(self):
+        """
+        :return: dict of the cache's size and counters
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'size': self.size,
+                'timeout': self.timeout,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+results = ResultCache(
+    getattr(settings, 'AUTOCOMPLETE_CACHE_SIZE', CACHE_SIZE),
+    getattr(settings, 'AUTOCOMPLETE_CACHE_TIMEOUT', CACHE_TIMEOUT))
+
+
+def normalize(query):
+    """
+    :param query: text typed in an autocomplete
+    :return: the search ignoring case and extra spaces
+    """
+    return ' '.join(query.lower().split())
+
+
+def forget_results(instance):
+    """
+    Drops cached searches affected by a saved or deleted player or team
+
+    :param instance: Player or Team that changed
+    """
+    results.forget(type(instance),
+                   getattr(instance, SEARCH_FIELDS[type(instance)]),
+                   instance.pk)
+
+
+def uses_database_index():
+    """
+    :return: True if the database has the search indexes
+    """
+    return connection.vendor == 'postgresql'
+
+
+def get_index(model):
+    """
+    :param model: Player or Team
+    :return: the in-process index for the model, built on first use
+    """
+    if model not in _indexes:
+        _indexes[model] = PrefixIndex.build(
+            model.objects.filter(is_active=True).values_list(
+                'pk', SEARCH_FIELDS[model]).iterator())
+    return _indexes[model]
+
+
+def update_index(instance):
+    """
+    Updates the in-process index after a player or team is saved. Nothing
+    happens if the index hasn't been built yet.
+
+    :param instance: saved Player or Team
+    """
+    index = _indexes.get(type(instance))
+    if index is None:
+        return
+    text = getattr(instance, SEARCH_FIELDS[type(instance)])
+    if instance.is_active and text:
+        index.add(instance.pk, text)
+    else:
+        index.remove(instance.pk)
+
+
+def remove_from_index(instance):
+    """
+    :param instance: deleted Player or Team
+    """
+    index = _indexes.get(type(instance))
+    if index is not None:
+        index.remove(instance.pk)
+
+
+def ranked_keys(model, query, limit=AUTOCOMPLETE_LIMIT):
+    """
+    :param model: Player or Team
+    :param query: text to search for
+    :param limit: most keys to return
+    :return: list of primary keys of active rows, prefix matches first
+    """
+    if not uses_database_index():
+        return get_index(model).search(query, limit)
+
+    field = SEARCH_FIELDS[model]
+    active = model.objects.filter(is_active=True)
+    keys = list(active.filter(**{field + '__istartswith': query}).
+                order_by(field).values_list('pk', flat=True)[:limit])
+    if len(keys) < limit:
+        keys += list(active.filter(**{field + '__icontains': query}).
+                     exclude(pk__in=keys).order_by().
+                     values_list('pk', flat=True)[:limit - len(keys)])
+    return keys
+
+
+def search(queryset, query, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Narrows a queryset of players or teams to the best matches for a search
+
+    :param queryset: queryset of Player or Team
+    :param query: text to search for
+    :param limit: most rows to return
+    :return: queryset of at most limit rows ordered by rank
+    """
+    query = normalize(query)
+    key = (queryset.model, query, limit)
+    keys = results.get(key)
+    if keys is None:
+        keys = ranked_keys(queryset.model, query, limit)
+        results.set(key, keys)
+    if not keys:
+        return queryset.none()
+    rank = Case(*[When(pk=key, then=Value(position))
+                  for position, key in enumerate(keys)],
+                output_field=IntegerField())
+    return queryset.filter(pk__in=keys).annotate(search_rank=rank). \
+        order_by('search_rank')
@@ -0,0 +1,257 @@
+"""
+Signal handlers for the scheduler app. These keep denormalized data in sync
+with the tables it is built from, and check reused database connections
+before each request. They are connected in SchedulerConfig.ready().
+"""
+import django
+from django.core.signals import request_started
+from django.db import connections
+from django.db.models.signals import m2m_changed, post_delete, \
+    post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from scheduler import membership, pages, search
+from scheduler.aggregates import refresh_team_stats
+from scheduler.availability import refresh_masks, mask_to_bytes
+from scheduler.models import Player, Team, TeamStats, TimeSlot
+
+
+@receiver(m2m_changed, sender=TimeSlot.players_available.through)
+def sync_availability_mask(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    """
+    Updates Player.availability_mask whenever TimeSlot.players_available is
+    changed through a related manager from either side.
+    """
+    if action == 'pre_clear' and not reverse:
+        # pk_set is None for clear, so remember who was in the slot
+        instance._cleared_players = list(
+            instance.players_available.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        player_pks = [instance.pk]
+    elif action == 'post_clear':
+        player_pks = instance.__dict__.pop('_cleared_players', [])
+    else:
+        player_pks = pk_set
+    masks = refresh_masks(player_pks)
+
+    if reverse:
+        # keep the in-memory player up to date
+        instance.availability_mask = mask_to_bytes(masks[instance.pk])
+
+
+@receiver(m2m_changed, sender=Team.players.through)
+def forget_team_members(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Removes cached rosters and player teams when Team.players changes from
+    either side.
+    """
+    if action == 'pre_clear':
+        # pk_set is None for clear, so remember who is being removed
+        related = instance.team_set if reverse else instance.players
+        instance._cleared_members = list(
+            related.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_members', [])
+    if reverse:
+        membership.forget_players([instance.pk])
+        membership.forget_teams(pk_set)
+    else:
+        membership.forget_teams([instance.pk])
+        membership.forget_players(pk_set)
+
+
+@receiver(pre_save, sender=Team)
+def remember_team_admin(sender, instance, raw, **kwargs):
+    """
+    Stores who administered a team before it is saved so both the old and
+    new admin can be forgotten once the save finishes.
+    """
+    if raw or instance._state.adding:
+        instance._old_admin_id = None
+        return
+    instance._old_admin_id = Team.objects.filter(pk=instance.pk). \
+        values_list('team_admin_id', flat=True).first()
+
+
+@receiver(post_save, sender=Team)
+def forget_team_admin(sender, instance, created, **kwargs):
+    """
+    Removes the cached admin teams of a team's old and new admin. New teams
+    also drop any roster left in the cache under the same teamID.
+    """
+    admins = {instance.team_admin_id,
+              instance.__dict__.pop('_old_admin_id', None)}
+    membership.forget_players([pk for pk in admins if pk is not None],
+                              admin=True)
+    if created:
+        membership.forget_teams([instance.pk])
+
+
+@receiver(pre_delete, sender=Team)
+def remember_deleted_members(sender, instance, **kwargs):
+    """
+    Deleting a team removes its roster without sending m2m_changed, so the
+    players are stored to be forgotten after the delete.
+    """
+    instance._deleted_members = list(
+        instance.players.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Team)
+def forget_deleted_team(sender, instance, **kwargs):
+    """ Removes everything cached about a deleted team """
+    membership.forget_teams([instance.pk])
+    membership.forget_players(instance.__dict__.pop('_deleted_members', []))
+    if instance.team_admin_id is not None:
+        membership.forget_players([instance.team_admin_id], admin=True)
+
+
+@receiver(post_save, sender=Player)
+def forget_new_player(sender, instance, created, **kwargs):
+    """
+    Drops anything cached under a new player's battlenetID, such as entries
+    left behind by a player that was deleted with the same BattleTag.
+    """
+    if created:
+        membership.forget_players([instance.pk], admin=True)
+
+
+@receiver(post_save, sender=Player)
+@receiver(post_save, sender=Team)
+def update_search_index(sender, instance, raw, update_fields=None,
+                        **kwargs):
+    """
+    Keeps the in-process autocomplete index and cached results in sync
+    with saves. Saves that don't touch the searched name or is_active, like
+    the last_login saved on every login, are skipped.
+    """
+    if update_fields is not None and \
+            not {search.SEARCH_FIELDS[sender], 'is_active'} & \
+            set(update_fields):
+        return
+    if not raw:
+        search.update_index(instance)
+        search.forget_results(instance)
+
+
+@receiver(post_delete, sender=Player)
+@receiver(post_delete, sender=Team)
+def remove_from_search_index(sender, instance, **kwargs):
+    """ Stops searching for deleted players and teams """
+    search.remove_from_index(instance)
+    search.forget_results(instance)
+
+
+@receiver(m2m_changed, sender=Team.players.through)
+def update_team_stats(sender, instance, action, reverse, pk_set, **kwargs):
+    """ Recounts the totals of teams whose rosters changed """
+    if action == 'pre_clear' and reverse:
+        # pk_set is None for clear, so remember the player's teams
+        instance._cleared_stats_teams = list(
+            instance.team_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        refresh_team_stats([instance.pk])
+    elif action == 'post_clear':
+        refresh_team_stats(instance.__dict__.pop('_cleared_stats_teams', []))
+    else:
+        refresh_team_stats(pk_set)
+
+
+@receiver(post_save, sender=Team)
+def create_team_stats(sender, instance, created, raw, **kwargs):
+    """ Starts a new team with empty totals """
+    if created and not raw:
+        TeamStats.objects.get_or_create(team=instance)
+
+
+@receiver(post_save, sender=Player)
+def update_player_team_stats(sender, instance, created, raw, update_fields,
+                             **kwargs):
+    """
+    Recounts the totals of a player's teams when their SR or role may have
+    changed. Saves of other fields, like last_login when logging in, are
+    skipped.
+    """
+    if created or raw:
+        return
+    if update_fields is not None and \
+            not {'skillRating', 'role'} & set(update_fields):
+        return
+    refresh_team_stats(Team.players.through.objects.filter(
+        player_id=instance.pk).values_list('team_id', flat=True))
+
+
+@receiver(pre_delete, sender=Player)
+def remember_player_teams(sender, instance, **kwargs):
+    """
+    Deleting a player removes them from their teams without sending
+    m2m_changed, so their teams are stored to be recounted afterwards.
+    """
+    instance._deleted_from_teams = list(Team.players.through.objects.filter(
+        player_id=instance.pk).values_list('team_id', flat=True))
+
+
+@receiver(post_delete, sender=Player)
+def update_deleted_player_team_stats(sender, instance, **kwargs):
+    """ Recounts the teams a deleted player was on """
+    refresh_team_stats(instance.__dict__.pop('_deleted_from_teams', []))
+
+
+# Player fields that aren't shown on any cached page
+UNCACHED_PLAYER_FIELDS = {'last_login', 'password'}
+
+
+@receiver(post_save, sender=Player)
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Player)
+@receiver(post_delete, sender=Team)
+def forget_cached_pages(sender, instance, update_fields=None, **kwargs):
+    """
+    Makes the cached public pages and tables stale when a player or team
+    changes. Logging in only saves last_login, so it doesn't count.
+    """
+    if update_fields and set(update_fields) <= UNCACHED_PLAYER_FIELDS:
+        return
+    pages.forget_pages()
+
+
+@receiver(m2m_changed, sender=Team.players.through)
+@receiver(m2m_changed, sender=TimeSlot.players_available.through)
+def forget_cached_rosters(sender, action, **kwargs):
+    """
+    Makes the cached pages stale when a roster or a player's availability
+    changes
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        pages.forget_pages()
+
+
+@receiver(request_started)
+def check_database_connections(**kwargs):
+    """
+    Closes kept open connections that stopped working, for example after
+    the database restarted, so the request opens a new one instead of
+    failing. Only done for databases with CONN_HEALTH_CHECKS (see
+    OWScheduler.databases); Django 4.1 and later check these themselves.
+    """
+    if django.VERSION >= (4, 1):
+        return
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block or \
+                not connection.settings_dict.get('CONN_HEALTH_CHECKS'):
+            continue
+        if not connection.is_usable():
+            connection.close()
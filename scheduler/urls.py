@@ -15,9 +15,13 @@ urlpatterns = [
          views.account, name='account'),  # edit player account
     path('teams/', views.teams, name='teams'),  # search for teams
     path('players/<str:username>/my-teams/', views.my_teams, name='my_teams'),
+    path('players/<str:username>/my-teams/events/', views.calendar_feed,
+         name='calendar_feed'),  # json match events for the calendar
     path('teams/<int:teamID>/', views.team_profile,
          name='team_profile'),  # team profile page
     path('teams/<int:teamID>/admin/', views.team_admin, name='team_admin'),
+    path('teams/<int:teamID>/opponents/', views.team_opponents,
+         name='team_opponents'),  # json matchmaking suggestions
     path('teams/create-team/', views.create_team, name='create_team'),
     path('create-match/', views.create_match, name='create_match'),
     path('edit-match/<int:match_id>/', views.edit_match, name='edit_match'),
@@ -27,5 +31,9 @@ urlpatterns = [
          name='join_team'),
     path('leave_team/<int:teamID>/<str:username>/', views.leave_team,
          name='leave_team'),
-    path('delete_team/<int:teamID>/', views.delete_team, name='delete_team')
+    path('delete_team/<int:teamID>/', views.delete_team, name='delete_team'),
+    path('calendars/players/<str:username>/<str:token>.ics',
+         views.player_calendar, name='player_calendar'),  # ics feeds
+    path('calendars/teams/<int:teamID>/<str:token>.ics',
+         views.team_calendar, name='team_calendar')
 ]
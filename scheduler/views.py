@@ -7,15 +7,29 @@ authentication on certain pages.
 Allison Bickford
 4/11/2019
 """
+import hashlib
+import json
+from calendar import timegm
+from collections import OrderedDict
+from datetime import datetime
+
 from django.shortcuts import get_object_or_404, render, render_to_response, \
     redirect, reverse
-from django.http import HttpResponseRedirect
-
-from django.db.models import Q, Avg
+from django.http import HttpResponse, HttpResponseRedirect, \
+    HttpResponseBadRequest, StreamingHttpResponse, Http404, JsonResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Exists, OuterRef, Prefetch
 
 from django.contrib.auth import authenticate, login, logout
-from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 
 from django.contrib import messages
 
@@ -23,45 +37,27 @@ from dal import autocomplete
 
 from scheduler.models import Player, Team, Match, TimeSlot
 from scheduler.forms import PlayerCreationForm, PlayerChangeForm, \
-    TeamAdminForm, MatchCreationForm, CreateTeamForm
-from scheduler.decorators import is_team_admin_or_superuser, \
+    TeamAdminForm, MatchCreationForm, CreateTeamForm, PlayerSearchForm, \
+    TeamSearchForm
+from scheduler.decorators import cache_for_anonymous, \
+    is_current_team_admin_or_superuser, is_team_admin_or_superuser, \
     is_user_or_superuser
-
-
-def login_context(request):
-    """
-    view that handles logging in the current user and returning the context
-
-    :param request: network request info, such as user
-    :returns dict containing login form, authenticated user,
-        teams, and teams user admins
-    """
-    if not request.user.is_authenticated:
-        user = None
-        form = AuthenticationForm()
-        user_team = None
-        admin_team = None
-        if request.method == 'POST':
-            form = AuthenticationForm(data=request.POST)
-            if form.is_valid():
-                form.clean()
-                username = form.cleaned_data.get('username')
-                password = form.cleaned_data.get('password')
-                user = authenticate(request,
-                                    username=username,
-                                    password=password)
-                if user is not None:
-                    login(request, user)
-                    player = Player.objects.get(username=username)
-                    user_team = Team.objects.filter(players=player)
-                    admin_team = Team.objects.filter(team_admin=player)
-        return {'login_form': form, 'user': user, 'user_teams': user_team,
-                'admin_teams': admin_team}
-
-    player = Player.objects.get(username=request.user.username)
-    user_team = Team.objects.filter(players=player)
-    admin_team = Team.objects.filter(team_admin=player)
-    return {'user_teams': user_team, 'admin_teams': admin_team}
+from scheduler.aggregates import team_stats
+from scheduler.availability import HOURS_PER_DAY, availability_grid, \
+    get_mask, mask_from_slot_ids, save_availability, slots_in_mask, \
+    timeslots_for_mask
+from scheduler.balance import balance_teams
+from scheduler.calendars import feed_token, check_feed_token, feed_state, \
+    ics_lines, player_matches, team_matches
+from scheduler.directory import filter_players, filter_teams, \
+    keyset_page, next_page_query
+from scheduler.matchmaking import clamp_minimum, find_opponents
+from scheduler.membership import admin_team_ids, is_team_admin, \
+    team_member_ids
+from scheduler.overlap import roster_roles, overlap, rank_quorum, \
+    TEAM_SIZE
+from scheduler import profiling
+from scheduler.search import search, results as search_results
 
 
 @login_required
@@ -75,6 +71,7 @@ def user_logout(request):
     return HttpResponseRedirect(next)  # temporary redirect
 
 
+@cache_for_anonymous
 def home(request):
     """
     Home page
@@ -82,29 +79,54 @@ def home(request):
     :param request: network request info
     :return: template and variables to pass into it
     """
-    context = login_context(request)  # has user, user_team, and login_form
-    return render(request, 'scheduler/default.html', context)
+    # user, user_teams, and login_form come from context_processors.login
+    return render(request, 'scheduler/default.html')
+
 
+PLAYER_DIRECTORY_FIELDS = ('battlenetID', 'username', 'role', 'skillRating',
+                           'university')
 
+
+@cache_for_anonymous
 def players(request):
     """
-    Goes to the players page using the list of players sorted by battletags and
-    uses the player search bar to generate the list of players matching the
-    search.
+    Goes to the players page with one page of players sorted by battletags.
+    Players can be filtered by battletag, role, university, and SR range.
+    The next page continues after the 'after' battletag. Adding format=json
+    returns the page as json instead.
 
     :param request: network request info
-    :return: login context and list of all players
+    :return: login context, a page of players, and the next page's query
     """
+    form = PlayerSearchForm(request.GET)
     player_list = Player.objects.filter(is_active=True). \
-        order_by('-battlenetID')
+        only(*PLAYER_DIRECTORY_FIELDS)
+    if form.is_valid():
+        player_list = filter_players(player_list, form.cleaned_data)
+    elif request.GET.get('format') == 'json':
+        return JsonResponse({'errors': form.errors}, status=400)
+    page = keyset_page(player_list, 'battlenetID', request.GET.get('after'))
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'players': [
+                dict({field: getattr(player, field)
+                      for field in PLAYER_DIRECTORY_FIELDS},
+                     url=reverse('scheduler:player_profile',
+                                 kwargs={'username': player.username}))
+                for player in page['items']],
+            'next': page['next'],
+        })
 
-    context = login_context(request)
-    context.update({
-        'player_list': player_list,
-    })
+    context = {
+        'form': form,
+        'player_list': page['items'],
+        'next_query': next_page_query(request.GET, page['next']),
+    }
     return render(request, 'scheduler/players.html', context)
 
 
+@cache_for_anonymous
 def player_profile(request, username):
     """
     displays the profile page for a player by username
@@ -118,13 +140,12 @@ def player_profile(request, username):
     player_teams = Team.objects.filter(players=player)
     admin_teams = Team.objects.filter(team_admin=player)
     times = TimeSlot.objects.filter(players_available=player)
-    context = login_context(request)
-    context.update({
+    context = {
         'current_player': player,
         'current_teams': player_teams,
         'current_admin_teams': admin_teams,
         'availability': times
-    })
+    }
     return render(request, 'scheduler/player_profile.html', context)
 
 
@@ -142,17 +163,7 @@ def account(request, username):
     template if user is not verified
     """
     player = get_object_or_404(Player, username=username)
-    context = login_context(request)
-
-    timeslots = TimeSlot.objects.filter(players_available=player)
-
-    #  creating a list for each hour to fill a table row by row (hour by
-    #  hour)
-    hour_lists = {}
-    for i in range(24):
-        hour_lists['hour{0}'.format(i)] = TimeSlot.objects.filter(hour=i)
-    context['timeslots'] = timeslots
-    context['hour_lists'] = hour_lists
+    context = {}
 
     if request.method == 'POST':
         if 'set-profile' in request.POST:
@@ -169,39 +180,53 @@ def account(request, username):
 
         if 'set-availability' in request.POST:
             form = PlayerChangeForm(instance=player)
-            #  remove previous availability
-            for slot in TimeSlot.objects.filter(players_available=player):
-                slot.players_available.remove(player)
-            #  restore with new availability
-            available_times = request.POST.getlist('availability')
-            for slot in available_times:
-                TimeSlot.objects.get(timeSlotID=slot).players_available.add(
-                    player)
-
-            messages.get_messages(request).used = True
-            messages.add_message(request, messages.SUCCESS, "Availability "
-                                                            "saved "
-                                                            "successfully.")
+            #  only the slots that changed are saved, all in one transaction
+            try:
+                mask = mask_from_slot_ids(request.POST.getlist('availability'))
+            except ValueError:
+                messages.get_messages(request).used = True
+                messages.add_message(request, messages.ERROR,
+                                     "Failed to save availability. Unknown "
+                                     "time slot.")
+            else:
+                save_availability(player, mask)
+                messages.get_messages(request).used = True
+                messages.add_message(request, messages.SUCCESS,
+                                     "Availability saved successfully.")
     else:
         form = PlayerChangeForm(instance=player)
 
     context['form'] = form
     context['player'] = player
+    #  table of slots filled row by row (hour by hour). Only the player's
+    #  availability is added per request, the slots themselves are cached
+    context['availability_grid'] = availability_grid(get_mask(player))
     return render(request, 'scheduler/account.html', context)
 
 
+@cache_for_anonymous
 def teams(request):
     """
-    displays the page that lists all the teams, sorted by their teamID. This
-    also implements searching for teams by their name or id.
+    displays one page of teams sorted by their teamID with their roster size
+    and average SR. Teams can be filtered by name, organization, and whether
+    they are active, which defaults to active teams. The next page continues
+    after the 'after' teamID.
 
     :param request: HttpRequest with network info
-    :return: template for teams with login context and list of all teams
+    :return: template for teams with login context, a page of teams, and the
+        next page's query
     """
-    team_list = Team.objects.order_by('-teamID')
-
-    context = login_context(request)
-    context.update({'team_list': team_list})
+    form = TeamSearchForm(request.GET)
+    team_list = Team.objects.select_related('stats')
+    team_list = filter_teams(team_list, form.cleaned_data
+                             if form.is_valid() else {})
+    page = keyset_page(team_list, 'teamID', request.GET.get('after'))
+
+    context = {
+        'form': form,
+        'team_list': page['items'],
+        'next_query': next_page_query(request.GET, page['next']),
+    }
     return render(request, 'scheduler/teams.html', context)
 
 
@@ -219,9 +244,8 @@ def create_team(request):
         form = CreateTeamForm(request.POST)
         if form.is_valid():
             form.save()
-            admin = Player.objects.get(username=request.user.username)
             new_team = Team.objects.get(teamID=form.cleaned_data["teamID"])
-            new_team.team_admin = admin
+            new_team.team_admin = request.player
             new_team.save()
             messages.get_messages(request).used = True
             messages.add_message(request, messages.SUCCESS,
@@ -232,9 +256,63 @@ def create_team(request):
             messages.add_message(request, messages.ERROR,
                                  "Failed to save information.")
 
-    context = login_context(request)
-    context['form'] = form
-    return render(request, 'scheduler/create_team.html', context)
+    return render(request, 'scheduler/create_team.html', {'form': form})
+
+
+def calendar_events(player, matches=None):
+    """
+    Builds the calendar events for every match a player is involved in. The
+    matches are loaded with a fixed number of queries no matter how many
+    there are.
+
+    :param player: player to build the calendar for
+    :param matches: optional queryset of matches to narrow down, such as a
+        date range
+    :return: list of event dicts for fullcalendar
+    """
+    through_1 = Match.player_set_1.through.objects.filter(player=player)
+    through_2 = Match.player_set_2.through.objects.filter(player=player)
+    matches = player_matches(player, matches). \
+        annotate(
+            playing_1=Exists(through_1.filter(match_id=OuterRef('pk'))),
+            playing_2=Exists(through_2.filter(match_id=OuterRef('pk')))). \
+        select_related('team_1', 'team_2'). \
+        prefetch_related(
+            Prefetch('player_set_1',
+                     queryset=Player.objects.only('battlenetID')),
+            Prefetch('player_set_2',
+                     queryset=Player.objects.only('battlenetID'))). \
+        order_by('time')
+
+    match_events = []
+    seen = set()
+    for match in matches:
+        if match.matchID in seen:
+            continue
+        seen.add(match.matchID)
+        if match.playing_1 or match.playing_2:
+            color = '#ffb135'
+            participation = 'You are playing in this match!'
+        elif (match.team_1 and match.team_1.team_admin_id == player.pk) or \
+                (match.team_2 and match.team_2.team_admin_id == player.pk):
+            color = '#2f7017'
+            participation = 'You admin a team in this match!'
+        else:
+            color = '#007bff'
+            participation = 'Your team is playing this match!'
+        match_events.append({
+            'id': match.matchID,
+            'title': str(match.team_1) + ' vs. ' + str(match.team_2),
+            'start': '%s-%s-%s' % (match.time.year, match.time.month,
+                                   match.time.day),
+            'backgroundColor': color,
+            'participation': participation,
+            'players_1': [member.battlenetID for member in
+                          match.player_set_1.all()],
+            'players_2': [member.battlenetID for member in
+                          match.player_set_2.all()],
+        })
+    return match_events
 
 
 @login_required
@@ -249,71 +327,126 @@ def my_teams(request, username):
     :param username: username of player's teams to view
     :return: template with relevant matches and teams in context
     """
-    context = login_context(request)
-    player = Player.objects.get(username=username)
+    context = {}
+    # the calendar loads its matches from calendar_feed
+    context['current_username'] = username
+    context['ics_url'] = request.build_absolute_uri(
+        reverse('scheduler:player_calendar',
+                kwargs={'username': username,
+                        'token': feed_token('player', username)}))
+    return render(request, 'scheduler/my_teams.html', context)
 
-    # matches a player's team is playing
-    teams_playing = Team.objects.filter(players=player)
-    user_matches = Match.objects.filter(
-        Q(team_1__in=teams_playing) | Q(team_2__in=teams_playing))\
-        .distinct()
 
-    # all matches a player is playing in
-    playing_matches = Match.objects.filter(
-        Q(player_set_1=player) | Q(player_set_2=player)).distinct()
+def parse_calendar_date(value):
+    """
+    Reads the start and end parameters sent by fullcalendar, which can be
+    a date or a datetime with or without an offset
 
-    # all matches for the team they admin
-    admin_teams = Team.objects.filter(team_admin=player)
-    team_matches = Match.objects.filter(
-        Q(team_1__in=admin_teams) | Q(team_2__in=admin_teams)).distinct()
+    :param value: date string from the request
+    :return: an aware datetime, or None if the value is not a date
+    """
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            parsed = parse_date(value)
+            if parsed is None:
+                return None
+            parsed = datetime.combine(parsed, datetime.min.time())
+    except ValueError:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
 
-    match_events = []
-    for match in playing_matches:
-        match_events.append({
-            'id': match.matchID,
-            'title': str(match.team_1) + ' vs. ' + str(match.team_2),
-            'start': str(match.time.year) + '-' +
-                     str(match.time.month) + '-' +
-                     str(match.time.day),
-            'backgroundColor': '#ffb135',
-            'participation': 'You are playing in this match!',
-            'players_1': list(match.player_set_1.values_list(
-                'battlenetID', flat=True)),
-            'players_2': list(match.player_set_2.values_list(
-                'battlenetID', flat=True)),
-        })
-    for match in user_matches:
-        if match not in playing_matches and match not in team_matches:
-            match_events.append({
-                'id': match.matchID,
-                'title': str(match.team_1) + ' vs. ' + str(match.team_2),
-                'start': str(match.time.year) + '-' +
-                         str(match.time.month) + '-' +
-                         str(match.time.day),
-                'backgroundColor': '#007bff',
-                'participation': 'Your team is playing this match!',
-                'players_1': list(match.player_set_1.values_list(
-                    'battlenetID', flat=True)),
-                'players_2': list(match.player_set_2.values_list(
-                    'battlenetID', flat=True)),
-            })
-    for match in team_matches:
-        if match not in playing_matches:
-            match_events.append({
-                'id': match.matchID,
-                'title': str(match.team_1) + ' vs. ' + str(match.team_2),
-                'start': str(match.time.year) + '-' +
-                         str(match.time.month) + '-' +
-                         str(match.time.day),
-                'backgroundColor': '#2f7017',
-                'participation': 'You admin a team in this match!',
-                'players_1': list(match.player_set_1.values_list(
-                    'battlenetID', flat=True)),
-                'players_2': list(match.player_set_2.values_list(
-                    'battlenetID', flat=True)),
-            })
-    context['matches_playing_json'] = match_events
-    return render(request, 'scheduler/my_teams.html', context)
+
+@login_required
+@is_user_or_superuser
+def calendar_feed(request, username):
+    """
+    JSON feed of a player's matches for the my teams calendar. Only matches
+    between the start and end parameters are returned, and an ETag is sent
+    so a month that has not changed returns 304 Not Modified.
+
+    :param request: network session info, with start and end parameters
+    :param username: username of the player whose matches to load
+    :return: JSON list of calendar events, or 400 if the range is invalid
+    """
+    player = get_object_or_404(Player, username=username)
+    start = parse_calendar_date(request.GET.get('start'))
+    end = parse_calendar_date(request.GET.get('end'))
+    if start is None or end is None or end <= start:
+        return HttpResponseBadRequest("start and end dates are required")
+
+    events = calendar_events(
+        player, Match.objects.filter(time__gte=start, time__lt=end))
+    content = json.dumps(events, cls=DjangoJSONEncoder)
+    etag = '"%s"' % hashlib.md5(content.encode()).hexdigest()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=0)
+    return response
+
+
+def ics_response(request, matches, name):
+    """
+    Streams an iCalendar feed. The feed's ETag and Last-Modified come from
+    one aggregate query, so calendar apps polling an unchanged feed get a
+    304 without the matches being loaded.
+
+    :param request: network request info
+    :param matches: queryset of matches in the feed
+    :param name: name of the calendar
+    :return: streamed text/calendar response or 304 Not Modified
+    """
+    count, latest = feed_state(matches)
+    last_modified = timegm(latest.utctimetuple()) if latest else None
+    etag = '"%s-%s"' % (count, last_modified or 0)
+    response = get_conditional_response(request, etag=etag,
+                                        last_modified=last_modified)
+    if response is None:
+        response = StreamingHttpResponse(
+            ics_lines(matches, name),
+            content_type='text/calendar; charset=utf-8')
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, max_age=300)
+    return response
+
+
+def player_calendar(request, username, token):
+    """
+    iCalendar feed of every match a player is involved in. The token from
+    calendars.feed_token is checked instead of requiring a login.
+
+    :param request: network request info
+    :param username: username of player whose matches to show
+    :param token: feed token for the player
+    :return: text/calendar feed, or 404 if the token is wrong
+    """
+    if not check_feed_token('player', username, token):
+        raise Http404
+    player = get_object_or_404(Player, username=username)
+    return ics_response(request, player_matches(player), str(player))
+
+
+def team_calendar(request, teamID, token):
+    """
+    iCalendar feed of every match a team is playing in.
+
+    :param request: network request info
+    :param teamID: primary key of team whose matches to show
+    :param token: feed token for the team
+    :return: text/calendar feed, or 404 if the token is wrong
+    """
+    if not check_feed_token('team', teamID, token):
+        raise Http404
+    team = get_object_or_404(Team, teamID=teamID)
+    return ics_response(request, team_matches(team), str(team))
 
 
 @login_required
@@ -327,7 +460,7 @@ def team_admin(request, teamID):
     :param teamID: primary key of team to manage
     :return: template with
     """
-    context = login_context(request)
+    context = {}
     team = get_object_or_404(Team, teamID=teamID)
 
     #  there was a weird problem with setting initial data in the form
@@ -342,6 +475,10 @@ def team_admin(request, teamID):
         {
             'form': form,
             'team': team,
+            'ics_url': request.build_absolute_uri(
+                reverse('scheduler:team_calendar',
+                        kwargs={'teamID': teamID,
+                                'token': feed_token('team', teamID)})),
             'players': team.players.all(),
             'all_players': Player.objects.filter(is_active=True).
                            order_by('-battlenetID'),
@@ -352,18 +489,17 @@ def team_admin(request, teamID):
         players_to_add = request.POST.get('players-to-add', None)
         if players_to_add:
             players_to_add = players_to_add.split(',')
+            members = set(team_member_ids(team.teamID, fresh=True))
             for new_player in players_to_add:
-                if Player.objects.get(username=new_player) \
-                        not in team.players.all():
-                    team.players.add(Player.objects.get(
-                        username=new_player))
+                player = Player.objects.get(username=new_player)
+                if player.pk not in members:
+                    team.players.add(player)
+                    members.add(player.pk)
                 else:
                     messages.get_messages(request).used = True
                     messages.add_message(request, messages.ERROR,
-                                         Player.objects.get(
-                                             username=new_player).
-                                         battlenetID + " is already "
-                                                       "on your team!")
+                                         player.battlenetID + " is already "
+                                                              "on your team!")
                     context['form'] = TeamAdminForm(
                         initial={'team_alias': team.teamAlias})
                     return render(request, 'scheduler/team_admin.html',
@@ -404,57 +540,51 @@ def team_profile(request, teamID):
     :param teamID: primary key of team to view profile of
     :return: template with information about the requested team
     """
-    team = get_object_or_404(Team, teamID=teamID)
-    context = login_context(request)
+    team = get_object_or_404(Team.objects.select_related('team_admin',
+                                                         'stats'),
+                             teamID=teamID)
+    context = {}
     # team currently viewing
     context['current_team'] = team
 
     # players in team
-    roster = Team.objects.get(teamID=teamID).players.all()
+    roster = team.players.all()
     context['roster'] = roster
 
-    # avg player skill rating
-    if roster.aggregate(avg_sr=Avg('skillRating'))['avg_sr']:
-        context['avg_sr'] = int(
-            roster.aggregate(avg_sr=Avg('skillRating'))['avg_sr'])
-    else:
-        context['avg_sr'] = None
+    # avg player skill rating from the stored roster totals
+    avg_sr = team_stats(team).avg_sr
+    context['avg_sr'] = int(avg_sr) if avg_sr else None
 
-    # get available times for all players
-    if roster:
-        all_times = TimeSlot.objects.filter(
-            players_available=roster[0])
-        for player in roster:
-            all_times = all_times.filter(
-                players_available=player).order_by('dayOfWeek', 'hour')
-            # filter so that times only contains that teams availability
+    # load every player's role and availability with one query
+    players = roster_roles(roster)
+    masks = {pk: mask for pk, (role, mask) in players.items()}
 
+    # best times where enough of the roster is free to play
+    minimum = request.GET.get('minimum', '')
+    minimum = int(minimum) if minimum.isdigit() else TEAM_SIZE
+    context['minimum'] = minimum
+    context['best_times'] = rank_quorum(players.values(), minimum)[:10]
+
+    # times all players are free
+    if masks:
         context['selected_players'] = roster
-        context['selected_times'] = all_times
+        context['selected_times'] = timeslots_for_mask(
+            overlap(masks.values())['common'])
 
     # filter times based on selected players
     if request.method == 'POST':
         selected_roster = request.POST.getlist('selected_user')
+        selected_masks = [masks[player] for player in selected_roster
+                          if player in masks]
         #  don't filter through every player if we already have it stored
-        if len(selected_roster) == len(roster):
-            context['selected_times'] = all_times
+        if len(selected_roster) == len(masks) and \
+                len(selected_masks) == len(masks):
             context['selected_players'] = roster
         #  filter list by availability for all selected team members
-        elif selected_roster and roster:
-            #  filter by the first player
-            player1 = Player.objects.get(battlenetID=selected_roster[0])
-            selected_times = TimeSlot.objects.filter(
-                players_available=player1)
-            #  filter by everyone else
-            for player in selected_roster:
-                selected_times = selected_times.filter(players_available=
-                                                       Player.objects.get(
-                                                           battlenetID=
-                                                           player)) \
-                                                .order_by('dayOfWeek', 'hour')
-
+        elif selected_masks:
             context['selected_players'] = selected_roster
-            context['selected_times'] = selected_times
+            context['selected_times'] = timeslots_for_mask(
+                overlap(selected_masks)['common'])
         else:
             context['selected_players'] = []
             context['selected_times'] = []
@@ -462,6 +592,48 @@ def team_profile(request, teamID):
     return render(request, 'scheduler/team_profile.html', context)
 
 
+@login_required
+def team_opponents(request, teamID):
+    """
+    JSON list of the best opponents for a team, ranked by how close their
+    average SR is and how many slots both teams can play in.
+
+    :param request: network session info, with optional limit (at most 50)
+        and minimum players free (at most TEAM_SIZE) parameters
+    :param teamID: primary key of the team looking for opponents
+    :return: JSON with the team's opponents, or 400 if the team has no SR
+    """
+    team = get_object_or_404(Team, teamID=teamID)
+    limit = request.GET.get('limit', '')
+    limit = min(int(limit), 50) if limit.isdigit() and int(limit) else 10
+    minimum = request.GET.get('minimum', '')
+    minimum = clamp_minimum(minimum) if minimum.isdigit() else TEAM_SIZE
+    try:
+        opponents = find_opponents(team, limit=limit, minimum=minimum)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    aliases = dict(Team.objects.filter(
+        teamID__in=[opponent['teamID'] for opponent in opponents]).
+        values_list('teamID', 'teamAlias'))
+    day_names = dict(TimeSlot.DAYS_OF_WEEK)
+    return JsonResponse({
+        'teamID': team.teamID,
+        'opponents': [{
+            'teamID': opponent['teamID'],
+            'teamAlias': aliases.get(opponent['teamID']),
+            'url': reverse('scheduler:team_profile',
+                           kwargs={'teamID': opponent['teamID']}),
+            'avg_sr': round(opponent['avg_sr']),
+            'sr_difference': round(opponent['sr_difference']),
+            'shared_slots': opponent['shared_slots'],
+            'slots': [{'day': day_names[index // HOURS_PER_DAY],
+                       'hour': index % HOURS_PER_DAY}
+                      for index in slots_in_mask(opponent['mask'])],
+        } for opponent in opponents],
+    })
+
+
 @login_required
 def join_team(request, teamID, username):
     """
@@ -477,11 +649,10 @@ def join_team(request, teamID, username):
     #  user is joining a team themselves or is superuser or is team admin
     if (request.user.username == username or
             request.user.is_superuser or
-            Player.objects.get(username=request.user.username) ==
-            Team.objects.get(teamID=teamID).team_admin):
+            is_team_admin(request.player, teamID, fresh=True)):
         if request.method == 'GET':
             #  a team can have 50 players
-            if len(Team.objects.get(teamID=teamID).players.all()) >= 50:
+            if len(team_member_ids(teamID, fresh=True)) >= 50:
                 messages.get_messages(request).used = True
                 messages.add_message(
                     request, messages.ERROR, "Join team failed. Only 50 "
@@ -491,7 +662,7 @@ def join_team(request, teamID, username):
                                 username=request.user.username)
             player = Player.objects.get(username=username)
             team = Team.objects.get(teamID=teamID)
-            if player not in team.players.all():
+            if player.pk not in team_member_ids(teamID, fresh=True):
                 team.players.add(player)
                 messages.success(request, "Joined team successfully.")
             else:
@@ -530,7 +701,7 @@ def leave_team(request, teamID, username):
         if request.method == 'GET':
             player = Player.objects.get(username=username)
             team = Team.objects.get(teamID=teamID)
-            if player in team.players.all():
+            if player.pk in team_member_ids(teamID, fresh=True):
                 team.players.remove(player)
                 messages.get_messages(request).used = True
                 messages.add_message(request, messages.SUCCESS,
@@ -541,12 +712,11 @@ def leave_team(request, teamID, username):
                                      "You cannot leave a team you are "
                                      "not in.")
     #  team admin kicking a player from a team
-    elif Player.objects.get(username=request.user.username) == \
-            Team.objects.get(teamID=teamID).team_admin:
+    elif is_team_admin(request.player, teamID, fresh=True):
         if request.method == 'GET':
             player = Player.objects.get(username=username)
             team = Team.objects.get(teamID=teamID)
-            if player in team.players.all():
+            if player.pk in team_member_ids(teamID, fresh=True):
                 team.players.remove(player)
                 messages.get_messages(request).used = True
                 messages.add_message(request,
@@ -569,7 +739,7 @@ def leave_team(request, teamID, username):
 
 
 @login_required
-@is_team_admin_or_superuser
+@is_current_team_admin_or_superuser
 def delete_team(request, teamID):
     """
     handles deleting a team instance. Requires team admin or superuser
@@ -639,9 +809,8 @@ def create_match(request):
     :return: redirects to next step in creating a match, or access denied if
     a user does not manage/admin any teams
     """
-    context = login_context(request)
-    if Team.objects.filter(team_admin=
-                           Player.objects.get(username=request.user.username)):
+    context = {}
+    if request.admin_teams:
         context['all_teams'] = Team.objects.all()
         context['my_team'] = None
         context['opponent_team'] = None
@@ -677,6 +846,55 @@ def create_match(request):
     return render(request, 'scheduler/access_denied.html')
 
 
+def is_match_admin(match, player, team_1=True, team_2=True, fresh=False):
+    """
+    Checks if a player admins a team in a match using the cached admin teams
+
+    :param match: match to check
+    :param player: player to check
+    :param team_1: check the admin of team 1
+    :param team_2: check the admin of team 2
+    :param fresh: read the admins from the database instead of the cache,
+        for requests that change the match
+    :return: True if the player is the admin of one of the checked teams
+    """
+    if fresh:
+        team_ids = [team_id for team_id, checked in
+                    ((match.team_1_id, team_1), (match.team_2_id, team_2))
+                    if checked and team_id is not None]
+        return player is not None and Team.objects.filter(
+            teamID__in=team_ids, team_admin_id=player.pk).exists()
+    admin_teams = admin_team_ids(player)
+    return (team_1 and match.team_1_id in admin_teams) or \
+        (team_2 and match.team_2_id in admin_teams)
+
+
+def split_usernames(usernames):
+    """
+    :param usernames: comma separated usernames posted by the match form
+    :return: list of the usernames without blanks or repeats, in order
+    """
+    if not usernames:
+        return []
+    return list(OrderedDict.fromkeys(
+        username.strip() for username in usernames.split(',')
+        if username.strip()))
+
+
+def players_by_username(usernames):
+    """
+    Looks up players by username with one query
+
+    :param usernames: usernames to look up
+    :return: dict of username to player for the players found, and a sorted
+        list of the usernames that don't exist
+    """
+    found = {player.username: player for player in
+             Player.objects.filter(username__in=set(usernames))}
+    unknown = sorted(set(usernames) - set(found))
+    return found, unknown
+
+
 @login_required
 def edit_match(request, match_id):
     """
@@ -687,17 +905,15 @@ def edit_match(request, match_id):
     :param match_id: primary key of match to edit
     :return: redirects to create_match_next, or access denied if not an admin
     """
-    context = login_context(request)
-    match = get_object_or_404(Match, matchID=match_id)
-
-    if (match.team_1.team_admin ==
-            Player.objects.get(username=request.user.username) or
-            match.team_2.team_admin ==
-            Player.objects.get(username=request.user.username)):
-        context['is_team_1'] = False
-        if match.team_1.team_admin == \
-                Player.objects.get(username=request.user.username):
-            context['is_team_1'] = True
+    context = {}
+    match = get_object_or_404(Match.objects.select_related('team_1',
+                                                           'team_2'),
+                              matchID=match_id)
+
+    if is_match_admin(match, request.player,
+                      fresh=request.method not in ('GET', 'HEAD')):
+        context['is_team_1'] = is_match_admin(match, request.player,
+                                              team_2=False)
         context['match'] = match
         context['all_teams'] = Team.objects.all()
         if request.method == 'POST':
@@ -729,53 +945,76 @@ def create_match_next(request, match_id):
     :return: redirects to my teams on successful change, access denied if user
     is not an admin, otherwise returns the create_match_next template
     """
-    context = login_context(request)
-    match = get_object_or_404(Match, matchID=match_id)
+    context = {}
+    match = get_object_or_404(Match.objects.select_related('team_1',
+                                                           'team_2'),
+                              matchID=match_id)
 
-    if (match.team_1.team_admin ==
-            Player.objects.get(username=request.user.username) or
-            match.team_2.team_admin ==
-            Player.objects.get(username=request.user.username)):
+    if is_match_admin(match, request.player,
+                      fresh=request.method not in ('GET', 'HEAD')):
         match_form = MatchCreationForm(initial={'matchMap': match.matchMap})
         context['match_form'] = match_form
         context['match'] = match
 
-        players_str = ''
-        for player in match.player_set_1.all():
-            players_str += str(player) + ','
-        context['my_players'] = players_str[:-1]
-
-        opponents = ''
-        for player in match.player_set_2.all():
-            opponents += str(player) + ','
-
-        context['opponent_players'] = opponents[:-1]
+        # battletags for the labels and pks for marking selected rows
+        for side, players in (('my', match.player_set_1),
+                              ('opponent', match.player_set_2)):
+            battletags = list(players.values_list('battlenetID', flat=True))
+            context[side + '_players'] = ','.join(battletags)
+            context[side + '_player_ids'] = set(battletags)
+
+        if request.method == 'POST' and 'balance-sides' in request.POST:
+            #  split the roster of a scrim into two sides with the closest
+            #  SR, matches between two teams keep their own rosters
+            try:
+                if match.team_1_id is None or \
+                        match.team_1_id != match.team_2_id:
+                    raise ValueError("Sides can only be balanced for a "
+                                     "scrim within one team.")
+                sides = balance_teams(Player.objects.filter(
+                    team=match.team_1_id).order_by('battlenetID'))
+            except ValueError as error:
+                messages.get_messages(request).used = True
+                messages.add_message(request, messages.ERROR, str(error))
+            else:
+                with transaction.atomic():
+                    match.player_set_1.set(sides['side_1'])
+                    match.player_set_2.set(sides['side_2'])
+                messages.get_messages(request).used = True
+                messages.add_message(request, messages.SUCCESS,
+                                     "Balanced sides with an SR difference "
+                                     "of %d." % sides['difference'])
+            return redirect(reverse('scheduler:create_match_next',
+                                    kwargs={'match_id': match.matchID}))
 
         if request.method == 'POST':
             match_form = MatchCreationForm(request.POST)
-            my_players = request.POST.get('my-players')
-            opp_players = request.POST.get('opponent-players')
-            if my_players:
-                my_players = my_players.split(',')
-                allies = []
-                for player in my_players:
-                    allies.append(Player.objects.get(username=player))
-                match.player_set_1.set(allies)
-
-            if opp_players:
-                opp_players = opp_players.split(',')
-                enemies = []
-                for player in opp_players:
-                    enemies.append(Player.objects.get(username=player))
-                match.player_set_2.set(enemies)
-
-            if match_form.is_valid():
-                map = match_form.cleaned_data['matchMap']
-                match.matchMap = map
-
-            if request.POST.get('match-winner'):
-                match.winner = request.POST.get('match-winner')
-            match.save()
+            my_players = split_usernames(request.POST.get('my-players'))
+            opp_players = split_usernames(request.POST.get('opponent-players'))
+            found, unknown = players_by_username(my_players + opp_players)
+            if unknown:
+                messages.get_messages(request).used = True
+                messages.add_message(request, messages.ERROR,
+                                     "Unknown players: %s." %
+                                     ', '.join(unknown))
+                return redirect(reverse('scheduler:create_match_next',
+                                        kwargs={'match_id': match.matchID}))
+
+            with transaction.atomic():
+                if my_players:
+                    match.player_set_1.set(
+                        [found[username] for username in my_players])
+                if opp_players:
+                    match.player_set_2.set(
+                        [found[username] for username in opp_players])
+
+                if match_form.is_valid():
+                    map = match_form.cleaned_data['matchMap']
+                    match.matchMap = map
+
+                if request.POST.get('match-winner'):
+                    match.winner = request.POST.get('match-winner')
+                match.save()
             messages.get_messages(request).used = True
             messages.add_message(request, messages.SUCCESS,
                                  "Created match successfully.")
@@ -837,7 +1076,7 @@ class TeamAutoComplete(autocomplete.Select2QuerySetView):
             if self.q.isdigit():
                 queryset = queryset.filter(teamID__exact=self.q)
             else:
-                queryset = queryset.filter(teamAlias__icontains=self.q)
+                queryset = search(queryset, self.q)
 
         return queryset
 
@@ -853,6 +1092,45 @@ class PlayerAutoComplete(autocomplete.Select2QuerySetView):
 
         queryset = Player.objects.filter(is_active=True)
         if self.q:
-            queryset = queryset.filter(battlenetID__icontains=self.q)
+            queryset = search(queryset, self.q)
 
         return queryset
+
+
+@staff_member_required
+def autocomplete_stats(request):
+    """
+    Shows how well the autocomplete result cache is working so its size can
+    be tuned. Only available to staff.
+
+    :param request: network request info
+    :return: json with the cache's size, hits, misses, and evictions
+    """
+    return JsonResponse(search_results.stats())
+
+
+@staff_member_required
+def profile_stats(request):
+    """
+    Shows the slowest scheduler views recorded by the profiling middleware,
+    combining every process that has saved its totals. Only available to
+    staff.
+
+    :param request: network request info, may have sort (see
+        profiling.SORTS) and limit in the query string
+    :return: json with the top views and the totals of every view
+    """
+    sort = request.GET.get('sort', 'wall')
+    if sort not in profiling.SORTS:
+        return JsonResponse({'error': "Unknown sort."}, status=400)
+    try:
+        limit = max(int(request.GET.get('limit', 10)), 1)
+    except ValueError:
+        limit = 10
+    profiling.store.publish(force=True)
+    totals = profiling.merge(profiling.published())
+    return JsonResponse({
+        'enabled': getattr(settings, 'SCHEDULER_PROFILING', False),
+        'top': profiling.top_offenders(totals, sort, limit),
+        'views': totals,
+    })